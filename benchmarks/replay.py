@@ -0,0 +1,230 @@
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes.chat_service import TracedScriptedChatCompletion
+from fakes.hue_bridge import FakeHueBridge, make_resources
+from fakes.weather_api import FakeWeatherAPI
+from managers.intent_router import normalize
+from managers.sk_manager import SKManager
+from managers.tracing import tracer, run_in_executor, format_summary
+from plugins.phillips_hue_lights_plugin import LightsPlugin
+from plugins.weather_plugin import WeatherPlugin
+
+# The home the corpus talks about
+ROOMS = {"Kitchen": 2, "Living Room": 3, "Sam's Bedroom": 2}
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus.jsonl")
+
+
+def load_corpus(path: str) -> list[dict]:
+    """
+    One JSON object per line: {"text": what is said, "wav": optional 16 kHz mono recording of "Hey Jarvis, <text>"
+    relative to the corpus file, "match" / "calls" / "reply": what the scripted LLM does with it}.
+    """
+    corpus = []
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                entry = json.loads(line)
+                if entry.get("wav"):
+                    entry["wav"] = os.path.join(os.path.dirname(os.path.abspath(path)), entry["wav"])
+                corpus.append(entry)
+    return corpus
+
+
+def make_script(corpus: list[dict]) -> list[dict]:
+    return [
+        {"match": entry.get("match") or re.escape(normalize(entry["text"])), "calls": entry.get("calls", []), "reply": entry.get("reply", "Okay.")}
+        for entry in corpus
+    ]
+
+
+async def run_text(sk_manager: SKManager, corpus: list[dict], repeat: int) -> dict:
+    """Sends the corpus transcripts straight to SKManager: the LLM, kernel function and HTTP paths only."""
+    completed = 0
+    for _ in range(repeat):
+        for entry in corpus:
+            with tracer.span("utterance"), tracer.span("request"):
+                async for _sentence in sk_manager.stream_user_request(entry["text"]):
+                    pass
+            completed += 1
+    return {"utterances": len(corpus) * repeat, "completed": completed}
+
+
+async def run_audio(sk_manager: SKManager, corpus: list[dict], wakeword_model_path: str, whisper_model_name: str, speed: float) -> dict:
+    """
+    Plays the corpus recordings through AudioManager in place of the mic and runs each request through the whole
+    loop: wake word, recording, whisper, SKManager and (silent) TTS.
+    """
+    from fakes.wav_source import WavFileStream
+    from managers.audio_manager import AudioManager
+    from managers.tts import NullBackend
+
+    entries = [entry for entry in corpus if entry.get("wav")]
+    if not entries:
+        raise ValueError("No corpus entries have a 'wav' recording")
+
+    source = {}
+    def open_wav_stream(callback):
+        source["stream"] = WavFileStream(
+            [entry["wav"] for entry in entries], callback, speed=speed,
+            # Ending capture makes the next wait_for_wake_word raise, which ends the run
+            on_finished=lambda: audio_manager.ring_buffer.close(), autostart=False,
+        )
+        return source["stream"]
+
+    audio_manager = AudioManager(wakeword_model_path, whisper_model_name, tts_backend=NullBackend(), input_stream_factory=open_wav_stream)
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="replay")
+    await run_in_executor(executor, audio_manager.wait_until_ready)
+    source["stream"].start_stream()
+
+    heard = set()
+    transcripts_matched = 0
+    try:
+        while True:
+            try:
+                await run_in_executor(executor, audio_manager.wait_for_wake_word)
+            except RuntimeError:
+                break
+            # Which recording the wake word was heard in, from how far into the audio the reader is
+            index = bisect_right(source["stream"].offsets, audio_manager.reader.pos) - 1
+
+            with tracer.span("utterance", file=os.path.basename(entries[index]["wav"])):
+                with tracer.span("record"):
+                    frames = await run_in_executor(executor, audio_manager.record_audio)
+                if not frames:
+                    continue
+                user_message = await run_in_executor(executor, audio_manager.transcribe_frames, frames)
+                with tracer.span("request"):
+                    audio_manager.begin_reply()
+                    async for sentence in sk_manager.stream_user_request(user_message):
+                        await run_in_executor(executor, audio_manager.tts_response, sentence, False)
+                    audio_manager.end_reply()
+
+            if index >= 0 and index not in heard:
+                heard.add(index)
+                transcripts_matched += normalize(user_message) == normalize(entries[index]["text"])
+    finally:
+        audio_manager.stop()
+        executor.shutdown(wait=False)
+
+    return {"utterances": len(entries), "completed": len(heard), "missed": len(entries) - len(heard), "transcripts_matched": transcripts_matched}
+
+
+async def run_benchmark(
+    corpus: list[dict],
+    audio: bool = False,
+    repeat: int = 1,
+    llm_latency: float = 0.0,
+    token_delay: float = 0.0,
+    http_latency: float = 0.0,
+    fast_path: bool = True,
+    cache_plans: bool = True,
+    wakeword_model_path: Optional[str] = None,
+    whisper_model_name: str = "tiny",
+    speed: float = 1.0,
+) -> dict:
+    """Runs the corpus against local stand-ins for Azure OpenAI, the Hue bridge and OpenWeatherMap."""
+    async with FakeHueBridge(make_resources(ROOMS), latency=http_latency) as bridge, FakeWeatherAPI(latency=http_latency) as weather_api:
+        plugins = [
+            {"plugin": LightsPlugin(bridge_url=bridge.url), "plugin_name": "Lights"},
+            {"plugin": WeatherPlugin(base_url=weather_api.base_url), "plugin_name": "Weather"}
+        ]
+        chat_completion = TracedScriptedChatCompletion(make_script(corpus), latency=llm_latency, token_delay=token_delay)
+        sk_manager = SKManager(plugins, fast_path=fast_path, cache_plans=cache_plans, chat_completion=chat_completion)
+        await sk_manager.start()
+
+        started = time.perf_counter()
+        try:
+            if audio:
+                result = await run_audio(sk_manager, corpus, wakeword_model_path, whisper_model_name, speed)
+            else:
+                result = await run_text(sk_manager, corpus, repeat)
+        finally:
+            await sk_manager.close()
+        wall_seconds = time.perf_counter() - started
+
+    return {
+        "mode": "audio" if audio else "text",
+        **result,
+        "wall_seconds": wall_seconds,
+        "throughput_per_second": result["completed"] / wall_seconds if wall_seconds else 0.0,
+        "paths": dict(sk_manager.path_counts),
+        "llm_round_trips": chat_completion.round_trips,
+        "stages": tracer.summary(),
+    }
+
+
+def compare_to_baseline(report: dict, baseline: dict, max_regression: float) -> list[str]:
+    """Stages whose p95 is more than `max_regression` (a fraction) slower than in the baseline report."""
+    regressions = []
+    for name, stats in report["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if before and before["p95"] > 0 and stats["p95"] > before["p95"] * (1 + max_regression):
+            regressions.append(f"{name}: p95 {before['p95']:.1f} ms -> {stats['p95']:.1f} ms")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a corpus of requests through the pipeline offline and report per-stage latency.")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--audio", action="store_true", help="Replay the corpus recordings through wake word + whisper too")
+    parser.add_argument("--wakeword-model", help="openWakeWord model path (--audio only)")
+    parser.add_argument("--whisper-model", default="tiny")
+    parser.add_argument("--speed", type=float, default=1.0, help="How much faster than real time to play recordings")
+    parser.add_argument("--repeat", type=int, default=20, help="Passes over the corpus in text mode")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per LLM round trip")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Simulated seconds between streamed words")
+    parser.add_argument("--http-latency", type=float, default=0.0, help="Simulated seconds per bridge / weather request")
+    parser.add_argument("--no-fast-path", action="store_true")
+    parser.add_argument("--no-plan-cache", action="store_true")
+    parser.add_argument("--trace-file", help="Also write every span to this JSONL file")
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--baseline", help="A previous --json report; exit with status 1 if a stage's p95 regressed")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args()
+
+    if args.audio and not args.wakeword_model:
+        parser.error("--audio needs --wakeword-model")
+
+    tracer.enable(jsonl_path=args.trace_file)
+    report = asyncio.run(run_benchmark(
+        load_corpus(args.corpus),
+        audio=args.audio,
+        repeat=args.repeat,
+        llm_latency=args.llm_latency,
+        token_delay=args.token_delay,
+        http_latency=args.http_latency,
+        fast_path=not args.no_fast_path,
+        cache_plans=not args.no_plan_cache,
+        wakeword_model_path=args.wakeword_model,
+        whisper_model_name=args.whisper_model,
+        speed=args.speed,
+    ))
+    tracer.close()
+
+    print(format_summary(report["stages"]))
+    print(f"\n{report['completed']}/{report['utterances']} utterances in {report['wall_seconds']:.2f} s "
+          f"({report['throughput_per_second']:.1f}/s), paths {report['paths']}, {report['llm_round_trips']} LLM round trips")
+    if args.audio:
+        print(f"{report['missed']} missed wake words, {report['transcripts_matched']} exact transcripts")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare_to_baseline(report, json.load(file), args.max_regression)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,113 @@
+from typing import Optional
+
+import argparse
+import json
+import sys
+import time
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from benchmarks.replay import DEFAULT_CORPUS, load_corpus
+from fakes.wav_source import read_wav_16k
+from managers.intent_router import normalize
+from managers.stt import STT_BACKENDS, STT_MODEL_CHOICE_FILE, make_stt_backend, default_stt_backend_name
+
+# Smallest to largest; bigger models are more accurate but slower
+MODELS = ["tiny", "base", "small", "medium", "large-v3"]
+RATE = 16000
+
+
+def load_clips(paths: list[str]) -> list[np.ndarray]:
+    return [read_wav_16k(path).astype(np.float32) / 32768.0 for path in paths]
+
+
+def measure(backend: str, model_name: str, clips: list[np.ndarray], expected: list[Optional[str]], threads: Optional[int] = None,
+            language: Optional[str] = None, **options) -> dict:
+    """
+    Real-time factor of one model: seconds spent transcribing per second of audio, so 0.25 transcribes a 4 s
+    request in 1 s. The first clip is transcribed once beforehand so one-off warmup isn't counted.
+    """
+    started = time.perf_counter()
+    stt = make_stt_backend(backend, model_name, threads=threads, language=language, **options)
+    load_seconds = time.perf_counter() - started
+    stt.transcribe(clips[0])
+
+    processing_seconds = 0.0
+    matched = 0
+    for clip, text in zip(clips, expected):
+        started = time.perf_counter()
+        result = stt.transcribe(clip)
+        processing_seconds += time.perf_counter() - started
+        # Corpus recordings start with the wake word, which whisper transcribes too
+        matched += text is not None and normalize(result["text"]).endswith(normalize(text))
+
+    audio_seconds = sum(len(clip) for clip in clips) / RATE
+    return {
+        "model": model_name,
+        "load_seconds": load_seconds,
+        "audio_seconds": audio_seconds,
+        "processing_seconds": processing_seconds,
+        "rtf": processing_seconds / audio_seconds,
+        "transcripts_matched": matched,
+    }
+
+
+def pick_model(results: list[dict], target_rtf: float) -> Optional[str]:
+    """The largest model whose real-time factor is within the target, or None if even the smallest misses it."""
+    fitting = [result for result in results if result["rtf"] <= target_rtf]
+    return max(fitting, key=lambda result: MODELS.index(result["model"]))["model"] if fitting else None
+
+
+def run(backend: str, models: list[str], clips: list[np.ndarray], expected: list[Optional[str]], target_rtf: float, **options) -> list[dict]:
+    """Measures models from smallest to largest, stopping at the first that misses the target: larger ones only get slower."""
+    results = []
+    for model_name in sorted(models, key=MODELS.index):
+        result = measure(backend, model_name, clips, expected, **options)
+        results.append(result)
+        print(f"{model_name:>10}  rtf {result['rtf']:.3f}  load {result['load_seconds']:.1f} s  "
+              f"{result['transcripts_matched']}/{len(clips)} exact", flush=True)
+        if result["rtf"] > target_rtf:
+            break
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the largest speech to text model that transcribes fast enough on this machine.")
+    parser.add_argument("--backend", choices=list(STT_BACKENDS), default=default_stt_backend_name())
+    parser.add_argument("--models", nargs="+", choices=MODELS, default=MODELS)
+    parser.add_argument("--compute-type", help="faster-whisper only: int8 (default), int8_float32, float32, ...")
+    parser.add_argument("--threads", type=int)
+    parser.add_argument("--language", default="en", help="Pinned language; pass '' to detect it on every request")
+    parser.add_argument("--target-rtf", type=float, default=0.3, help="Largest acceptable seconds of processing per second of audio")
+    parser.add_argument("--wav", nargs="+", help="16 kHz mono recordings (default: the replay corpus recordings)")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--json", default=STT_MODEL_CHOICE_FILE, help="Where to write the results (default: where STT_MODEL=auto reads them)")
+    args = parser.parse_args()
+
+    if args.wav:
+        paths, expected = args.wav, [None] * len(args.wav)
+    else:
+        entries = [entry for entry in load_corpus(args.corpus) if entry.get("wav")]
+        paths, expected = [entry["wav"] for entry in entries], [entry["text"] for entry in entries]
+    if not paths:
+        parser.error("No recordings: pass --wav or add 'wav' entries to the corpus")
+
+    options = {"threads": args.threads, "language": args.language or None}
+    if args.compute_type:
+        if args.backend != "faster-whisper":
+            parser.error("--compute-type needs --backend faster-whisper")
+        options["compute_type"] = args.compute_type
+
+    results = run(args.backend, args.models, load_clips(paths), expected, args.target_rtf, **options)
+    best = pick_model(results, args.target_rtf)
+    if best:
+        print(f"\nLargest model within rtf {args.target_rtf}: {best} ({args.backend})")
+    else:
+        print(f"\nNo model is within rtf {args.target_rtf} with {args.backend}; try faster-whisper, more threads or a higher target")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+    with open(args.json, "w") as file:
+        json.dump({"backend": args.backend, "target_rtf": args.target_rtf, "results": results, "best": best}, file, indent=2)
+    print(f"Saved to {args.json}" + ("; STT_MODEL=auto now uses it" if args.json == STT_MODEL_CHOICE_FILE else ""))
@@ -0,0 +1,105 @@
+from collections.abc import AsyncGenerator
+from typing import Any
+
+import asyncio
+import json
+import re
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.contents import ChatHistory, ChatMessageContent, FunctionCallContent, AuthorRole
+from semantic_kernel.contents.streaming_chat_message_content import StreamingChatMessageContent
+
+from managers.intent_router import normalize
+from managers.tracing import TracedChatCompletionMixin
+
+
+class ScriptedChatCompletion(ChatCompletionClientBase):
+    """
+    Stand-in for AzureChatCompletion that answers from a script instead of a model, for running SKManager offline.
+
+    Each script entry is {"match": regex, "calls": [{"function": "Lights-change_group_state", "arguments": {...}}],
+    "reply": "..."}. The regex is matched against the normalized latest user message (see intent_router.normalize).
+    The first round trip returns the entry's calls as tool calls, which Semantic Kernel invokes against the real
+    plugins; the next returns the reply. `latency` is added to every round trip and `token_delay` between streamed
+    words, to mimic the real service. Unmatched messages get `fallback_reply`.
+    """
+
+    SUPPORTS_FUNCTION_CALLING = True
+
+    script: list[tuple[Any, list[dict], str]] = []
+    fallback_reply: str = "Sorry, I can't help with that."
+    latency: float = 0.0
+    token_delay: float = 0.0
+    round_trips: int = 0
+
+    def __init__(self, script: list[dict], latency: float = 0.0, token_delay: float = 0.0, fallback_reply: str = "Sorry, I can't help with that."):
+        super().__init__(
+            ai_model_id="scripted",
+            script=[(re.compile(entry["match"]), entry.get("calls", []), entry["reply"]) for entry in script],
+            latency=latency,
+            token_delay=token_delay,
+            fallback_reply=fallback_reply,
+        )
+
+    def get_prompt_execution_settings_class(self) -> type[PromptExecutionSettings]:
+        return PromptExecutionSettings
+
+    def _next_message(self, chat_history: ChatHistory) -> ChatMessageContent:
+        self.round_trips += 1
+
+        # Everything after the latest user message was added while answering it
+        last_user = max((i for i, message in enumerate(chat_history.messages) if message.role == AuthorRole.USER), default=-1)
+        user_message = normalize(chat_history.messages[last_user].content or "") if last_user >= 0 else ""
+        answered_calls = any(message.role == AuthorRole.TOOL for message in chat_history.messages[last_user + 1:])
+
+        for pattern, calls, reply in self.script:
+            if not pattern.fullmatch(user_message):
+                continue
+            if calls and not answered_calls:
+                return ChatMessageContent(
+                    role=AuthorRole.ASSISTANT,
+                    items=[
+                        FunctionCallContent(
+                            id=f"call_{self.round_trips}_{i}",
+                            name=call["function"],
+                            arguments=json.dumps(call.get("arguments", {})),
+                        )
+                        for i, call in enumerate(calls)
+                    ],
+                    ai_model_id=self.ai_model_id,
+                )
+            return ChatMessageContent(role=AuthorRole.ASSISTANT, content=reply, ai_model_id=self.ai_model_id)
+        return ChatMessageContent(role=AuthorRole.ASSISTANT, content=self.fallback_reply, ai_model_id=self.ai_model_id)
+
+    async def _inner_get_chat_message_contents(self, chat_history: ChatHistory, settings: PromptExecutionSettings) -> list[ChatMessageContent]:
+        await asyncio.sleep(self.latency)
+        return [self._next_message(chat_history)]
+
+    async def _inner_get_streaming_chat_message_contents(
+        self, chat_history: ChatHistory, settings: PromptExecutionSettings, function_invoke_attempt: int = 0
+    ) -> AsyncGenerator[list[StreamingChatMessageContent], Any]:
+        await asyncio.sleep(self.latency)
+        message = self._next_message(chat_history)
+
+        if not message.content:
+            yield [StreamingChatMessageContent(
+                role=AuthorRole.ASSISTANT, choice_index=0, items=message.items,
+                ai_model_id=self.ai_model_id, function_invoke_attempt=function_invoke_attempt,
+            )]
+            return
+
+        for i, word in enumerate(message.content.split(" ")):
+            if i and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield [StreamingChatMessageContent(
+                role=AuthorRole.ASSISTANT, choice_index=0, content=(" " if i else "") + word,
+                ai_model_id=self.ai_model_id, function_invoke_attempt=function_invoke_attempt,
+            )]
+
+
+class TracedScriptedChatCompletion(TracedChatCompletionMixin, ScriptedChatCompletion):
+    """ScriptedChatCompletion that records a span for every round trip, like SKManager's Azure service."""
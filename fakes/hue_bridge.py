@@ -0,0 +1,183 @@
+from typing import Optional
+from urllib.parse import urlsplit
+
+import asyncio
+import json
+import uuid
+
+
+def make_resources(rooms: dict[str, int]) -> list[dict]:
+    """Builds a CLIP v2 resource listing with `count` lights per room name, each room with its own grouped_light."""
+    resources = []
+    for room_name, count in rooms.items():
+        room_id, group_id = str(uuid.uuid4()), str(uuid.uuid4())
+        device_ids = []
+        for i in range(1, count + 1):
+            device_id, light_id = str(uuid.uuid4()), str(uuid.uuid4())
+            device_ids.append(device_id)
+            slug = room_name.lower().replace(" ", "-").replace("'", "")
+            resources.append({"type": "device", "id": device_id, "services": [{"rid": light_id, "rtype": "light"}]})
+            resources.append({
+                "type": "light",
+                "id": light_id,
+                "owner": {"rid": device_id, "rtype": "device"},
+                "metadata": {"name": f"{slug}-light-{i}"},
+                "on": {"on": True},
+                "dimming": {"brightness": 100.0},
+                "color": {"xy": {"x": 0.3865, "y": 0.3784}},
+            })
+        resources.append({
+            "type": "room",
+            "id": room_id,
+            "metadata": {"name": room_name},
+            "children": [{"rid": device_id, "rtype": "device"} for device_id in device_ids],
+            "services": [{"rid": group_id, "rtype": "grouped_light"}],
+        })
+        resources.append({
+            "type": "grouped_light",
+            "id": group_id,
+            "owner": {"rid": room_id, "rtype": "room"},
+            "on": {"on": True},
+            "dimming": {"brightness": 100.0},
+        })
+    return resources
+
+
+class FakeHueBridge:
+    """
+    Local stand-in for a Hue bridge's CLIP v2 API over plain HTTP, for running LightsPlugin without hardware.
+
+    Serves GET /clip/v2/resource[/<type>], PUT /clip/v2/resource/<type>/<id> and the /eventstream/clip/v2
+    server-sent event stream. Every PUT is echoed to event stream subscribers like a real bridge does, and
+    `set_state` simulates a change made elsewhere (wall switch, Hue app). Point LightsPlugin at it with
+    `LightsPlugin(bridge_url=bridge.url)`.
+    """
+
+    def __init__(self, resources: Optional[list[dict]] = None, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.resources = {resource["id"]: resource for resource in (resources if resources is not None else make_resources({"Bedroom": 3}))}
+        self.host = host
+        self.port = port
+        # Artificial per-request delay, to mimic a real bridge in benchmarks
+        self.latency = latency
+        self.requests: list[tuple[str, str]] = []
+        self.subscribers: set[asyncio.Queue] = set()
+        self.connections: dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self.server: Optional[asyncio.base_events.Server] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def stop(self) -> None:
+        for queue in self.subscribers:
+            queue.put_nowait(None)
+        if self.server is not None:
+            self.server.close()
+            # Newer Pythons wait for open keep-alive connections in wait_closed, so drop them first
+            for writer in list(self.connections):
+                writer.close()
+            await asyncio.gather(*self.connections.values(), return_exceptions=True)
+            await self.server.wait_closed()
+
+    async def __aenter__(self) -> "FakeHueBridge":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    def set_state(self, resource_id: str, changes: dict) -> None:
+        """Changes a resource as if from outside the assistant and pushes the matching update event."""
+        resource = self.resources[resource_id]
+        resource.update(changes)
+        self.push_event("update", [{"id": resource_id, "type": resource["type"], **changes}])
+
+    def push_event(self, event_type: str, data: list[dict]) -> None:
+        event = [{"id": str(uuid.uuid4()), "type": event_type, "data": data}]
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+    # --- HTTP handling ---
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode().split(" ", 2)
+
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                path = urlsplit(target).path.rstrip("/")
+                self.requests.append((method, path))
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+
+                if method == "GET" and path == "/eventstream/clip/v2":
+                    await self._stream_events(writer)
+                    break
+
+                status, payload = self._route(method, path, body)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.pop(writer, None)
+            writer.close()
+
+    def _route(self, method: str, path: str, body: bytes) -> tuple[str, dict]:
+        parts = path.split("/")[4:] if path.startswith("/clip/v2/resource") else None
+        if parts is None:
+            return "404 Not Found", {"errors": [{"description": "not found"}], "data": []}
+
+        if method == "GET" and not parts:
+            return "200 OK", {"errors": [], "data": list(self.resources.values())}
+        if method == "GET" and len(parts) == 1:
+            return "200 OK", {"errors": [], "data": [r for r in self.resources.values() if r["type"] == parts[0]]}
+        if method == "GET" and len(parts) == 2 and parts[1] in self.resources:
+            return "200 OK", {"errors": [], "data": [self.resources[parts[1]]]}
+        if method == "PUT" and len(parts) == 2 and parts[1] in self.resources:
+            changes = json.loads(body or b"{}")
+            changes.pop("id", None)
+            changes.pop("type", None)
+            self.set_state(parts[1], changes)
+            return "200 OK", {"errors": [], "data": [{"rid": parts[1], "rtype": parts[0]}]}
+
+        return "404 Not Found", {"errors": [{"description": "not found"}], "data": []}
+
+    async def _stream_events(self, writer: asyncio.StreamWriter) -> None:
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+
+        queue: asyncio.Queue = asyncio.Queue()
+        self.subscribers.add(queue)
+        try:
+            while (event := await queue.get()) is not None:
+                writer.write(f"id: {event[0]['id']}\ndata: {json.dumps(event)}\n\n".encode())
+                await writer.drain()
+        finally:
+            self.subscribers.discard(queue)
+
+
+if __name__ == "__main__":
+    async def main():
+        bridge = FakeHueBridge()
+        print(f"Fake Hue bridge listening on {await bridge.start()}")
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
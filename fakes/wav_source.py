@@ -0,0 +1,93 @@
+from typing import Callable, Optional
+
+import threading
+import time
+import wave
+import numpy as np
+
+
+def read_wav_16k(path: str) -> np.ndarray:
+    """Reads a 16 kHz mono int16 WAV file, the only format the wake word and whisper models take as-is."""
+    with wave.open(path, "rb") as wav_file:
+        if (wav_file.getframerate(), wav_file.getnchannels(), wav_file.getsampwidth()) != (16000, 1, 2):
+            raise ValueError(f"{path} must be 16 kHz mono 16-bit PCM (ffmpeg -i in.wav -ar 16000 -ac 1 -sample_fmt s16 out.wav)")
+        return np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype=np.int16)
+
+
+class WavFileStream:
+    """
+    Stands in for AudioManager's PyAudio input stream, playing WAV files into the capture callback instead of
+    the microphone. Pass it as `AudioManager(input_stream_factory=lambda callback: WavFileStream(paths, callback))`.
+
+    Files are separated by `gap_seconds` of silence, long enough for the endpointer to end the request and the wake
+    word cooldown to pass. `speed` above 1 feeds audio faster than real time. `on_finished` is called once the last
+    file and the trailing silence have been fed. With autostart=False nothing is fed until `start_stream()`.
+    """
+
+    RATE = 16000
+    CHUNK = 1280
+
+    def __init__(
+        self,
+        paths: list[str],
+        stream_callback: Callable,
+        gap_seconds: float = 3.0,
+        speed: float = 1.0,
+        on_finished: Optional[Callable[[], None]] = None,
+        autostart: bool = True,
+    ):
+        silence = np.zeros(int(gap_seconds * WavFileStream.RATE), dtype=np.int16)
+        parts = [silence]
+        # Sample offset at which each file starts, for matching detections back to files
+        self.offsets = []
+        for path in paths:
+            self.offsets.append(sum(len(part) for part in parts))
+            parts += [read_wav_16k(path), silence]
+        self.samples = np.concatenate(parts)
+
+        self.stream_callback = stream_callback
+        self.speed = speed
+        self.on_finished = on_finished
+        self.position = 0
+        self.active = threading.Event()
+        self.closed = False
+        self.finished = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="wav-source", daemon=True)
+        if autostart:
+            self.active.set()
+        self.thread.start()
+
+    def _run(self) -> None:
+        interval = WavFileStream.CHUNK / WavFileStream.RATE / self.speed
+        next_time = time.monotonic()
+        while self.position < len(self.samples) and not self.closed:
+            if not self.active.is_set():
+                self.active.wait()
+                # Don't try to catch up on the time spent paused
+                next_time = time.monotonic()
+            chunk = self.samples[self.position:self.position + WavFileStream.CHUNK]
+            self.position += len(chunk)
+            self.stream_callback(chunk.tobytes(), len(chunk), None, 0)
+
+            # Paced against a fixed schedule so slow callbacks don't make the stream drift
+            next_time += interval
+            time.sleep(max(0.0, next_time - time.monotonic()))
+
+        self.finished.set()
+        if self.on_finished and not self.closed:
+            self.on_finished()
+
+    # The subset of the PyAudio stream interface AudioManager uses
+
+    def start_stream(self) -> None:
+        self.active.set()
+
+    def stop_stream(self) -> None:
+        self.active.clear()
+
+    def is_active(self) -> bool:
+        return self.active.is_set() and not self.finished.is_set()
+
+    def close(self) -> None:
+        self.closed = True
+        self.active.set()
@@ -0,0 +1,122 @@
+from datetime import datetime, timezone
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+import asyncio
+import json
+
+
+DEFAULT_CITIES = {
+    "new york": {"name": "New York", "temp": 68.4, "feels_like": 67.9, "description": "clear sky"},
+    "chicago": {"name": "Chicago", "temp": 55.2, "feels_like": 52.0, "description": "broken clouds"},
+    "seattle": {"name": "Seattle", "temp": 49.8, "feels_like": 47.1, "description": "light rain"},
+}
+
+
+class FakeWeatherAPI:
+    """
+    Local stand-in for the OpenWeatherMap /data/2.5/weather and /data/2.5/forecast endpoints, for running
+    WeatherPlugin without an API key. Point WeatherPlugin at it with `WeatherPlugin(base_url=api.base_url)`.
+    Unknown cities get the API's 404 response.
+    """
+
+    def __init__(self, cities: Optional[dict[str, dict]] = None, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.cities = {name.lower(): city for name, city in (cities or DEFAULT_CITIES).items()}
+        self.host = host
+        self.port = port
+        # Artificial per-request delay, to mimic the real API in benchmarks
+        self.latency = latency
+        self.requests: list[str] = []
+        self.connections: dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self.server: Optional[asyncio.base_events.Server] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/data/2.5"
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self.connections):
+                writer.close()
+            await asyncio.gather(*self.connections.values(), return_exceptions=True)
+            await self.server.wait_closed()
+
+    async def __aenter__(self) -> "FakeWeatherAPI":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    # --- HTTP handling ---
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode().split(" ", 2)
+                # Headers aren't needed, and GETs have no body
+                while await reader.readline() not in (b"\r\n", b"\n", b""):
+                    pass
+
+                url = urlsplit(target)
+                self.requests.append(url.path)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+
+                status, payload = self._route(method, url.path, parse_qs(url.query))
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.pop(writer, None)
+            writer.close()
+
+    def _route(self, method: str, path: str, query: dict[str, list[str]]) -> tuple[str, dict]:
+        city = self.cities.get(" ".join(query.get("q", [""])[0].lower().split()))
+        if method != "GET" or path not in ("/data/2.5/weather", "/data/2.5/forecast"):
+            return "404 Not Found", {"cod": "404", "message": "Internal error"}
+        if city is None:
+            return "404 Not Found", {"cod": "404", "message": "city not found"}
+
+        if path == "/data/2.5/weather":
+            return "200 OK", {
+                "name": city["name"],
+                "weather": [{"description": city["description"]}],
+                "main": {"temp": city["temp"], "feels_like": city["feels_like"]},
+            }
+
+        # Every 3 hours of today (UTC, with a zero timezone offset), warmest mid-afternoon
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        entries = [
+            {"dt_txt": f"{today} {hour:02d}:00:00", "main": {"temp": city["temp"] - abs(15 - hour) / 2}}
+            for hour in range(0, 24, 3)
+        ]
+        return "200 OK", {"city": {"name": city["name"], "timezone": 0}, "list": entries}
+
+
+if __name__ == "__main__":
+    async def main():
+        api = FakeWeatherAPI()
+        await api.start()
+        print(f"Fake weather API listening on {api.base_url}")
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
@@ -1,63 +1,197 @@
-from managers.sk_manager import SKManager
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 from managers.audio_manager import AudioManager
-from plugins.phillips_hue_lights_plugin import LightsPlugin
-from plugins.weather_plugin import WeatherPlugin
+from managers.tracing import tracer, run_in_executor
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+if TYPE_CHECKING:
+    from managers.sk_manager import SKManager
 
-import time
-import collections
-import numpy as np
+STOP = None
+
+# Each request carries an "utterance" span from the wake word to the end of its reply through the queues,
+# so the spans every stage records for it share one trace
+
+async def listen_stage(audio_manager: AudioManager, executor: ThreadPoolExecutor, stt_queue: asyncio.Queue):
+    """Waits for the wake word and records the request that follows it."""
+    while True:
+        await run_in_executor(executor, audio_manager.wait_for_wake_word)
+        utterance = tracer.span("utterance")
+        print("\033[1;32m* Listening...\033[0m")
+        
+        if audio_manager.streaming_transcription:
+            # Decoded while it is being spoken, which needs the mic, so it happens here and the STT stage passes it on
+            with tracer.use_span(utterance), tracer.span("record", streaming=True):
+                user_message = await run_in_executor(executor, audio_manager.get_audio_after_wake_word)
+            await stt_queue.put((utterance, user_message))
+            continue
+        
+        with tracer.use_span(utterance), tracer.span("record") as record:
+            frames = await run_in_executor(executor, audio_manager.record_audio)
+            record.set_attribute("audio_seconds", len(frames) * AudioManager.CHUNK / AudioManager.RATE)
+        # Nothing was said after the wake word (likely a false trigger), so go back to listening for it
+        if not frames:
+            utterance.end()
+            continue
+        await stt_queue.put((utterance, frames))
+        
+async def stt_stage(audio_manager: AudioManager, executor: ThreadPoolExecutor, stt_queue: asyncio.Queue, request_queue: asyncio.Queue):
+    while True:
+        utterance, audio = await stt_queue.get()
+        # Recorded frames, or the transcript itself with streaming transcription
+        if isinstance(audio, str):
+            user_message = audio
+        else:
+            with tracer.use_span(utterance):
+                user_message = await run_in_executor(executor, audio_manager.transcribe_frames, audio)
+        if not user_message.strip():
+            utterance.end()
+            continue
+        await request_queue.put((utterance, user_message))
+        
+async def llm_stage(sk_manager: SKManager, request_queue: asyncio.Queue, tts_queue: asyncio.Queue):
+    while True:
+        utterance, user_message = await request_queue.get()
+        
+        if user_message.strip(" .!?").lower() == 'exit':
+            print("Exiting the chat. Goodbye!")
+            utterance.end()
+            await tts_queue.put(STOP)
+            return
+        
+        print("You > " + user_message)
+        
+        # Each sentence goes to TTS as soon as it has streamed in, so speech starts before the reply is finished
+        reply_id = object()
+        print("Assistant >", end="", flush=True)
+        with tracer.use_span(utterance), tracer.span("request"):
+            async for sentence in sk_manager.stream_user_request(user_message):
+                print(" " + sentence, end="", flush=True)
+                await tts_queue.put((reply_id, utterance, sentence))
+        print()
+        # Marks the end of the reply
+        await tts_queue.put((reply_id, utterance, None))
+        
+async def tts_stage(audio_manager: AudioManager, executor: ThreadPoolExecutor, tts_queue: asyncio.Queue):
+    interrupted_reply = None
+    spoken_reply = None
+    while True:
+        item = await tts_queue.get()
+        if item is STOP:
+            return
+        reply_id, utterance, sentence = item
+        if sentence is None:
+            if reply_id is spoken_reply:
+                audio_manager.end_reply()
+            utterance.end()
+            continue
+        # Once the user barges in, the rest of that reply is dropped
+        if reply_id is interrupted_reply:
+            continue
+        if reply_id is not spoken_reply:
+            spoken_reply = reply_id
+            # A wake word heard between this reply's sentences interrupts it too, not only one during playback
+            audio_manager.begin_reply()
+            utterance.set_attribute("first_audio_ms", round(utterance.duration * 1000, 3))
+        # Capture keeps running while speaking, so the next wake word is picked up during playback
+        with tracer.use_span(utterance):
+            completed = await run_in_executor(executor, audio_manager.tts_response, sentence, False)
+        if not completed:
+            interrupted_reply = reply_id
 
 async def main(sk_manager: SKManager, audio_manager: AudioManager):
-    last_save = time.time()
-    activation_times = collections.defaultdict(list)
+    """
+    Runs the voice loop as a pipeline of stages connected by queues:
+    wake word + recording -> whisper -> LLM -> TTS.
+    Blocking audio work runs on one worker thread per stage, so the event loop is never blocked
+    and each stage can work on the next request while the later stages finish the previous one.
+    """
+    await sk_manager.start()
+    # The wake word and whisper models load in the background from the moment AudioManager is created
+    await asyncio.get_running_loop().run_in_executor(None, audio_manager.wait_until_ready)
+    
+    listen_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="listen")
+    stt_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stt")
+    tts_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts")
+    
+    stt_queue = asyncio.Queue(maxsize=4)
+    request_queue = asyncio.Queue(maxsize=4)
+    tts_queue = asyncio.Queue(maxsize=4)
     
     # Start conversation
     print("Say 'Hey Jarvis' followed by a request. Say 'Hey Jarvis, exit' to end the conversation.")
     
-    while True:
-        mic_audio = np.frombuffer(audio_manager.stream.read(AudioManager.CHUNK, exception_on_overflow=False), dtype=np.int16)
-        (detected_wake_word, last_save, activation_times) = audio_manager.detect_wake_word(mic_audio, last_save, activation_times)
-        
-        if detected_wake_word:
-            print("\033[1;32m* Listening...\033[0m")
-            user_message = audio_manager.get_audio_after_wake_word()
-            
-            if user_message.lower() == 'exit':
-                print("Exiting the chat. Goodbye!")
-                break
-            
-            print("You > " + user_message)
-            
-            result = await sk_manager.make_user_request(user_message)
-            
-            print("Assistant > " + str(result))
-            
-            audio_manager.tts_response(str(result))
-                
+    # The conversation ends once the LLM stage sees 'exit' and TTS has finished speaking
+    conversation = asyncio.gather(
+        llm_stage(sk_manager, request_queue, tts_queue),
+        tts_stage(audio_manager, tts_executor, tts_queue),
+    )
+    # Listening and transcription never finish on their own; if one fails, the later stages would wait forever
+    background_stages = [
+        asyncio.create_task(listen_stage(audio_manager, listen_executor, stt_queue)),
+        asyncio.create_task(stt_stage(audio_manager, stt_executor, stt_queue, request_queue)),
+    ]
+    try:
+        done, _ = await asyncio.wait([conversation, *background_stages], return_when=asyncio.FIRST_COMPLETED)
+        for stage in done:
+            # Raises the error of a stage that failed
+            stage.result()
+    finally:
+        for stage in (conversation, *background_stages):
+            stage.cancel()
+        await asyncio.gather(conversation, *background_stages, return_exceptions=True)
+        # Closing the stream unblocks the listen thread if it is still waiting on the mic
+        audio_manager.stop()
+        await sk_manager.close()
+        for executor in (listen_executor, stt_executor, tts_executor):
+            executor.shutdown(wait=False, cancel_futures=True)
+        if tracer.enabled:
+            print(tracer.format_summary())
+            tracer.close()
             
         
-        
 if __name__ == "__main__":
-    lights = [
-        {"id": "a60e6289-7979-4036-b1d5-a3795efba4b3", "name": "bedroom-light-1", "is_on": True, "brightness": 100.0, "color": {"x": 0.3865, "y":0.3784}},
-        {"id": "7ac12c9c-4bc3-4792-83e2-67e93fa9ea6f", "name": "bedroom-light-2", "is_on": True, "brightness": 100.0, "color": {"x": 0.3865, "y":0.3784}},
-        {"id": "4e8a1e19-63a6-49dd-bc8d-4dbb703e1652", "name": "bedroom-light-3", "is_on": True, "brightness": 100.0, "color": {"x": 0.3865, "y":0.3784}}
-    ]
-    groups = [
-        {"id": "bac841b0-3881-4c55-ad41-15b3afa249aa", "name": "Sam's Bedroom", "is_on": True, "brightness": 100.0, "color": {"x": 0.3865, "y":0.3784}}
-    ]
-
+    import os
+    from dotenv import load_dotenv
+    from managers.stt import auto_stt_model
+    
+    # The plugins load .env when they are imported, but the settings below are read before that
+    load_dotenv()
+    
+    jarvis_model_path = "/Users/sam/Library/CloudStorage/OneDrive-TimothyChristianSchool/Stem Internship/Microsoft/NL Action Engine/.venv/lib/python3.13/site-packages/openwakeword/resources/models/hey_jarvis_v0.1.onnx"
+    # STT_MODEL picks the whisper model; "auto" uses the one benchmarks/stt_models.py found fast enough on this machine
+    whisper_model_name = os.getenv("STT_MODEL") or 'tiny'
+    stt_backend = os.getenv("STT_BACKEND") or None
+    if whisper_model_name == "auto":
+        whisper_model_name, measured_backend = auto_stt_model('tiny')
+        stt_backend = stt_backend or measured_backend
+    # Set MODEL_SERVER_ADDRESS (host:port) to use the whisper model kept loaded by `python -m managers.model_server`
+    model_server = os.getenv("MODEL_SERVER_ADDRESS")
+    whisper_server = (model_server.rsplit(":", 1)[0], int(model_server.rsplit(":", 1)[1])) if model_server else None
+    # STT_BACKEND (whisper / faster-whisper), STT_THREADS and STT_LANGUAGE (e.g. en) tune local transcription
+    stt_threads = int(os.getenv("STT_THREADS")) if os.getenv("STT_THREADS") else None
+    # Set TRACE_FILE to write per-stage timing spans as JSONL, and / or TRACE_OTEL to send them to OpenTelemetry
+    if os.getenv("TRACE_FILE") or os.getenv("TRACE_OTEL"):
+        tracer.enable(jsonl_path=os.getenv("TRACE_FILE"), otel=bool(os.getenv("TRACE_OTEL")))
+    # Created first so the models load while Semantic Kernel is imported and set up below
+    am = AudioManager(
+        jarvis_model_path, whisper_model_name, barge_in=True, whisper_server=whisper_server,
+        stt_backend=stt_backend, stt_threads=stt_threads, language=os.getenv("STT_LANGUAGE") or None,
+    )
+    
+    from managers.sk_manager import SKManager
+    from plugins.phillips_hue_lights_plugin import LightsPlugin
+    from plugins.weather_plugin import WeatherPlugin
+    
     plugins = [
-        {"plugin": LightsPlugin(lights, groups), "plugin_name": "Lights"},
+        {"plugin": LightsPlugin(), "plugin_name": "Lights"},
         {"plugin": WeatherPlugin(), "plugin_name": "Weather"}
     ]
 
     skm = SKManager(plugins)
     
-    jarvis_model_path = "/Users/sam/Library/CloudStorage/OneDrive-TimothyChristianSchool/Stem Internship/Microsoft/NL Action Engine/.venv/lib/python3.13/site-packages/openwakeword/resources/models/hey_jarvis_v0.1.onnx"
-    whisper_model_name = 'tiny'
-    am = AudioManager(jarvis_model_path, whisper_model_name)
-    
-    import asyncio
     asyncio.run(main(skm, am))  
     
\ No newline at end of file
@@ -1,17 +1,35 @@
-from pyaudio import paInt16, PyAudio
-import keyboard
+try:
+    from pyaudio import paInt16, paContinue, PyAudio
+except ImportError:
+    # PyAudio needs PortAudio, which audio fed in through input_stream_factory (benchmarks, tests) can do without
+    PyAudio = None
+    paInt16, paContinue = 8, 0
 import time
 import wave
 
-import openwakeword
-from openwakeword.model import Model
 import collections
+import threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import tempfile
+import logging
 import os
-import whisper
-import subprocess
+from typing import Callable, Generator
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.ring_buffer import AudioRingBuffer
+from managers.endpointing import Endpointer, VADEndpointer
+from managers.tts import TTSBackend, PhraseCache, default_tts_backend
+from managers.model_server import RemoteWhisper
+from managers.stt import STTBackend, make_stt_backend, default_stt_backend_name
+from managers.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# whisper, openwakeword and keyboard are imported where they are first used: importing them (torch especially)
+# is a large part of startup time, and the models load on background threads instead.
 
 class AudioManager:
     FORMAT = paInt16
@@ -26,29 +44,203 @@ class AudioManager:
         enable_noise_suppression: bool = False,
         vad_threshold: float = 0.75, 
         inference_framework: str = "onnx",
+        debug_save_wav: bool = False,
+        ring_buffer_seconds: float = 10.0,
+        streaming_transcription: bool = False,
+        stream_step_seconds: float = 1.5,
+        stream_window_seconds: float = 8.0,
+        endpointer: Endpointer | None = None,
+        tts_backend: TTSBackend | None = None,
+        tts_cache_dir: str | None = None,
+        barge_in: bool = False,
+        barge_in_threshold: float = 0.9,
+        barge_in_speech_seconds: float = 0.3,
+        echo_coupling: float = 0.5,
+        duck_gain: float = 0.3,
+        whisper_server: tuple[str, int] | None = None,
+        stt_backend: str | None = None,
+        stt_threads: int | None = None,
+        language: str | None = None,
+        input_stream_factory: Callable | None = None,
     ):
-        self.audio = PyAudio()
-        self.stream = self.audio.open(
-            format=AudioManager.FORMAT,
-            channels=AudioManager.CHANNELS,
-            rate=AudioManager.RATE,
-            input=True,
-            frames_per_buffer=AudioManager.CHUNK
+        self.vad_threshold = vad_threshold
+        
+        # Wake word detection state for wait_for_wake_word
+        self.last_save = time.time()
+        self.activation_times = collections.defaultdict(list)
+        
+        # Load the wake word and whisper models in parallel in the background while the rest of startup runs.
+        # With whisper_server, transcription uses a model already resident in a model server process instead.
+        self._loader = ThreadPoolExecutor(max_workers=2, thread_name_prefix="model-loader")
+        self._wake_word_future = self._loader.submit(
+            self._load_wake_word_models, wakeword_model_path, enable_noise_suppression, inference_framework, endpointer
         )
+        if whisper_server:
+            self._transcriber_future = self._loader.submit(RemoteWhisper, whisper_server)
+        else:
+            # stt_backend is "whisper" or "faster-whisper" (int8 CTranslate2); language pins e.g. "en" to skip detection
+            self._transcriber_future = self._loader.submit(
+                make_stt_backend, stt_backend or default_stt_backend_name(), whisper_model_name, stt_threads, language
+            )
+        self._loader.shutdown(wait=False)
         
+        # Set once every model has loaded
+        self.ready = threading.Event()
+        self._pending_loads = [self._wake_word_future, self._transcriber_future]
+        for future in self._pending_loads:
+            future.add_done_callback(self._on_model_loaded)
+        
+        # Mic audio is captured on PortAudio's callback thread into a preallocated ring buffer,
+        # so capture keeps up no matter how long the LLM / TTS stages take
+        self.ring_buffer = AudioRingBuffer(int(ring_buffer_seconds * AudioManager.RATE))
+        self.reader = self.ring_buffer.reader()
+        
+        # Only opened for the microphone or for playing PCM replies, so injected input works without PortAudio
+        self.audio = None
+        if input_stream_factory is not None:
+            # Called with the capture callback; returns a stream-like source such as fakes.wav_source.WavFileStream
+            self.stream = input_stream_factory(self._capture_callback)
+        else:
+            self.audio = PyAudio()
+            self.stream = self.audio.open(
+                format=AudioManager.FORMAT,
+                channels=AudioManager.CHANNELS,
+                rate=AudioManager.RATE,
+                input=True,
+                frames_per_buffer=AudioManager.CHUNK,
+                stream_callback=self._capture_callback
+            )
+        
+        # When True, transcription goes through a temp WAV file that is kept and logged (slower, but it can be inspected)
+        self.debug_save_wav = debug_save_wav
+        
+        # Text to speech; in-process backends are played through our PyAudio instance with frequent phrases cached
+        self.tts_backend = tts_backend or default_tts_backend()
+        self.phrase_cache = PhraseCache(directory=tts_cache_dir)
+        self.output_streams = {}
+        
+        # Barge-in: while a reply plays, the wake word (or, for PCM backends, sustained speech louder than the
+        # expected echo of the reply) interrupts it. The wake word threshold is raised during playback so the
+        # reply itself is less likely to trigger it, and playback is ducked while the user seems to be talking.
+        self.barge_in = barge_in
+        self.barge_in_threshold = barge_in_threshold
+        self.barge_in_chunks = max(1, int(barge_in_speech_seconds * AudioManager.RATE / AudioManager.CHUNK))
+        self.echo_coupling = echo_coupling
+        self.duck_gain = duck_gain
+        self.speaking = threading.Event()
+        # Set from the first sentence of a streamed reply to its end, including the gaps between sentences,
+        # so an interruption at any point drops the rest of the reply (see begin_reply)
+        self.replying = threading.Event()
+        self.playback_interrupted = threading.Event()
+        self.playback_gain = 1.0
+        self.playback_levels = collections.deque(maxlen=4)
+        self.barge_in_speech_chunks = 0
+        
+        # Streaming mode decodes the request while it is still being spoken, so only the tail is left once it ends
+        self.streaming_transcription = streaming_transcription
+        self.stream_step_seconds = stream_step_seconds
+        self.stream_window_seconds = stream_window_seconds
+
+        
+    def _load_wake_word_models(self, wakeword_model_path, enable_noise_suppression, inference_framework, endpointer):
+        from openwakeword.model import Model
         
-        self.vad_threshold = vad_threshold
         # Init openwakeword model
-        self.owwModel = Model(
+        owwModel = Model(
             wakeword_models=[wakeword_model_path],
             enable_speex_noise_suppression=enable_noise_suppression,
             vad_threshold=self.vad_threshold,
             inference_framework=inference_framework
         )
+        # Decides when a request starts and ends; defaults to openWakeWord's Silero VAD
+        return (owwModel, endpointer or VADEndpointer(AudioManager.RATE))
+    
+    def _on_model_loaded(self, future) -> None:
+        if all(f.done() for f in self._pending_loads):
+            self.ready.set()
+    
+    def wait_until_ready(self, timeout: float | None = None) -> bool:
+        """Blocks until the models have loaded. Raises if one of them failed to load."""
+        if not self.ready.wait(timeout):
+            return False
+        for future in self._pending_loads:
+            future.result()
+        return True
+    
+    # These block until their model has finished loading in the background
+    
+    @property
+    def owwModel(self):
+        return self._wake_word_future.result()[0]
+    
+    @property
+    def endpointer(self) -> Endpointer:
+        return self._wake_word_future.result()[1]
+    
+    @property
+    def transcriber(self) -> STTBackend:
+        return self._transcriber_future.result()
         
-        # Init whisper model
-        self.whisper_model = whisper.load_model(whisper_model_name)
-
+    def _capture_callback(self, in_data, frame_count, time_info, status):
+        self.ring_buffer.write(np.frombuffer(in_data, dtype=np.int16))
+        return (None, paContinue)
+    
+    def read_chunk(self) -> bytes:
+        """Reads the next CHUNK of mic audio from the ring buffer, blocking until it has been captured."""
+        samples = self.reader.read(AudioManager.CHUNK)
+        if samples is None:
+            raise RuntimeError("Audio capture has stopped.")
+        return samples.tobytes()
+        
+    def wait_for_wake_word(self) -> None:
+        """Blocks until the wake word is heard."""
+        while True:
+            mic_audio = np.frombuffer(self.read_chunk(), dtype=np.int16)
+            (detected_wake_word, self.last_save, self.activation_times) = self.detect_wake_word(mic_audio, self.last_save, self.activation_times)
+            if detected_wake_word:
+                # Otherwise the wake word still in the model's buffers fires again once the request has been
+                # recorded, since the mic isn't paused (and the model not reset) while replying
+                self.owwModel.reset()
+                if self.barge_in and self._is_replying():
+                    self.interrupt_playback()
+                return
+            if self.barge_in and self._is_replying() and self._is_barge_in_speech(mic_audio):
+                self.interrupt_playback()
+                
+    def _is_replying(self) -> bool:
+        return self.speaking.is_set() or self.replying.is_set()
+                
+    def _is_barge_in_speech(self, mic_audio: np.ndarray) -> bool:
+        """Checks for the user talking over playback, ducking the reply while they might be."""
+        # Without the played samples there is no echo estimate, so only the wake word can interrupt `say`
+        if not self.tts_backend.produces_pcm:
+            return False
+        
+        echo_level = self.echo_coupling * max(self.playback_levels, default=0.0)
+        level = float(np.abs(mic_audio).mean())
+        if level > max(self.endpointer.min_speech_level, echo_level + self.endpointer.noise_floor * self.endpointer.noise_floor_margin):
+            self.barge_in_speech_chunks += 1
+            self.playback_gain = self.duck_gain
+        else:
+            self.barge_in_speech_chunks = 0
+            self.playback_gain = 1.0
+        return self.barge_in_speech_chunks >= self.barge_in_chunks
+    
+    def interrupt_playback(self) -> None:
+        """Stops the reply that is currently being spoken."""
+        self.playback_interrupted.set()
+        self.tts_backend.stop()
+        
+    def begin_reply(self) -> None:
+        """
+        Starts a reply spoken over several tts_response calls. Until end_reply, an interruption between sentences
+        counts too, and every later tts_response returns False without speaking.
+        """
+        self.playback_interrupted.clear()
+        self.replying.set()
+        
+    def end_reply(self) -> None:
+        self.replying.clear()
         
     def live_transcribing_with_wake_word(self):
         last_save = time.time()
@@ -56,7 +248,7 @@ class AudioManager:
         
         print("Listening...")
         while True:
-            mic_audio = np.frombuffer(self.stream.read(AudioManager.CHUNK, exception_on_overflow=False), dtype=np.int16)
+            mic_audio = np.frombuffer(self.read_chunk(), dtype=np.int16)
             
             (detected_wake_word, last_save, activation_times) = self.detect_wake_word(mic_audio, last_save, activation_times)
             # print((detected_wake_word, last_save, activation_times))
@@ -65,23 +257,77 @@ class AudioManager:
                 print("Recording audio...")
                 
                 frames = self.record_audio()
-                tmp = self.save_temp_wav_file(frames)
                 
                 print("Recorded request.")
                 print("Transcribing...")
                 
-                result = whisper.transcribe(self.whisper_model, tmp, fp16=False)
-                os.remove(tmp)
+                text = self.transcribe_frames(frames)
                 
-                print("Here's your transcript:\n  "  + result['text'])
+                print("Here's your transcript:\n  "  + text)
                 
                 
     def get_audio_after_wake_word(self) -> str:
+        if self.streaming_transcription:
+            text = ""
+            for text, is_final in self.transcribe_streaming():
+                pass
+            return text
+        
         frames = self.record_audio()
-        tmp = self.save_temp_wav_file(frames)
+        return self.transcribe_frames(frames)
+    
+    def transcribe_streaming(self) -> Generator[tuple[str, bool], None, None]:
+        """
+        Records a request and decodes it in overlapping windows while it is being spoken.
+        Yields (text, is_final) pairs: partial hypotheses every `stream_step_seconds`, then the final transcript.
+        """
+        step = int(self.stream_step_seconds * AudioManager.RATE)
+        window = int(self.stream_window_seconds * AudioManager.RATE)
         
-        result = whisper.transcribe(self.whisper_model, tmp, fp16=False)
-        os.remove(tmp)
+        frames = []
+        committed_text = ""
+        committed_samples = 0
+        decoded_samples = 0
+        
+        for data in self._record_chunks():
+            frames.append(data)
+            total = len(frames) * AudioManager.CHUNK
+            if total - decoded_samples < step:
+                continue
+            decoded_samples = total
+            
+            audio = self.frames_to_float32(frames)[committed_samples:]
+            result = self._transcribe_array(audio, initial_prompt=committed_text or None)
+            segments = result['segments']
+            
+            # Once the uncommitted audio outgrows the window, lock in every segment but the last
+            # (whisper's last segment is the one still likely to change) and slide the window forward
+            if len(audio) > window and len(segments) > 1:
+                committed_text += "".join(seg['text'] for seg in segments[:-1])
+                committed_samples += int(segments[-1]['start'] * AudioManager.RATE)
+                yield ((committed_text + segments[-1]['text']).strip(), False)
+            else:
+                yield ((committed_text + result['text']).strip(), False)
+        
+        # Only the audio after the last committed segment has to be decoded now
+        audio = self.frames_to_float32(frames)[committed_samples:]
+        tail = self._transcribe_array(audio, initial_prompt=committed_text or None)['text'] if len(audio) else ""
+        yield ((committed_text + tail).strip(), True)
+    
+    def _transcribe_array(self, audio: np.ndarray, **kwargs) -> dict:
+        with tracer.span("whisper", audio_seconds=len(audio) / AudioManager.RATE, streaming="initial_prompt" in kwargs):
+            return self.transcriber.transcribe(audio, **kwargs)
+    
+    def transcribe_frames(self, frames: list) -> str:
+        if self.debug_save_wav:
+            # Kept for inspection, not deleted
+            tmp = self.save_temp_wav_file(frames)
+            logger.info("Saved request audio to %s", tmp)
+            with tracer.span("whisper", audio_seconds=len(frames) * AudioManager.CHUNK / AudioManager.RATE, from_file=True):
+                result = self.transcriber.transcribe(tmp)
+        else:
+            # Hand the samples straight to whisper, skipping the disk write and ffmpeg decode
+            result = self._transcribe_array(self.frames_to_float32(frames))
         
         return result['text']
                 
@@ -91,11 +337,13 @@ class AudioManager:
         save_delay = 0.1
             
         # Feed to openWakeWord model
-        prediction = self.owwModel.predict(mic_audio)
+        with tracer.timer("wake_word.predict"):
+            prediction = self.owwModel.predict(mic_audio)
         
         # Check for model activation
+        threshold = self.barge_in_threshold if self.barge_in and self.speaking.is_set() else self.vad_threshold
         for mdl in prediction.keys():
-            if prediction[mdl] >= self.vad_threshold:
+            if prediction[mdl] >= threshold:
                 activation_times[mdl].append(time.time())
             
             if activation_times.get(mdl) and (time.time() - last_save) >= cooldown and (time.time() - activation_times.get(mdl)[0]) >= save_delay:
@@ -108,34 +356,34 @@ class AudioManager:
                
         
     def record_audio(self) -> list:
-        frames = []
+        return list(self._record_chunks())
+    
+    def _record_chunks(self) -> Generator[bytes, None, None]:
+        """Yields mic chunks as they are recorded until the request ends."""
+        try:
+            import keyboard
+        except ImportError:
+            # keyboard needs root on Linux, so headless runs (e.g. benchmarks) go without the space bar shortcut
+            keyboard = None
         
-        silence_threshold = 500
-        silence_duration = 1.5
-        silent_chunks = 0
-        max_silent = int(silence_duration * AudioManager.RATE / AudioManager.CHUNK)
-        started = False
+        self.endpointer.reset()
         
         while True:
-            data = self.stream.read(AudioManager.CHUNK, exception_on_overflow=False)
-            audio_chunk = np.frombuffer(data, dtype=np.int16)
-            volume = np.abs(audio_chunk).mean()
+            data = self.read_chunk()
+            with tracer.timer("endpointer.update"):
+                ended = self.endpointer.update(np.frombuffer(data, dtype=np.int16))
             
-            if volume > silence_threshold:
-                started = True
-                silent_chunks = 0
-                frames.append(data)
-            elif started:
-                silent_chunks += 1
-                frames.append(data)
-                if silent_chunks >= max_silent:
-                    break
-            elif keyboard.is_pressed('space'):
+            if self.endpointer.started:
+                yield data
+            if ended:
+                break
+            if not self.endpointer.started and keyboard is not None and keyboard.is_pressed('space'):
                 break
-        return frames
         
     
     def simple_audio_record(self):
+        import keyboard
+        
         frames = []
         print("Press SPACE to start recording.")
         keyboard.wait('space')
@@ -144,7 +392,7 @@ class AudioManager:
         
         while True:
             try:
-                data = self.stream.read(AudioManager.CHUNK, exception_on_overflow=False)
+                data = self.read_chunk()
                 frames.append(data)
             except KeyboardInterrupt:
                 break
@@ -156,20 +404,75 @@ class AudioManager:
         
         self.frames_to_wav(frames)
         
-    def tts_response(self, text: str):
+    def tts_response(self, text: str, pause_capture: bool = True) -> bool:
+        """Speaks `text`. Returns False if playback was interrupted by barge-in."""
+        # With pause_capture=False the mic keeps listening while speaking, so the next wake word can be heard
+        if not pause_capture:
+            return self.speak(text)
+        
         self.stream.stop_stream()
-        subprocess.run(["say", text])
+        completed = self.speak(text)
         self.stream.start_stream()
+        # Don't feed audio captured before the pause into the wake word model
+        self.reader.skip_to_latest()
         self.owwModel.reset()
+        return completed
+        
+    def speak(self, text: str) -> bool:
+        # Outside a reply every call stands alone; within one, an interrupted reply stays interrupted
+        if not self.replying.is_set():
+            self.playback_interrupted.clear()
+        elif self.playback_interrupted.is_set():
+            return False
+        self.playback_gain = 1.0
+        self.barge_in_speech_chunks = 0
+        self.speaking.set()
+        try:
+            with tracer.span("tts", chars=len(text), backend=self.tts_backend.cache_id) as span:
+                if self.tts_backend.produces_pcm:
+                    with tracer.span("tts.synthesize"):
+                        samples, rate = self.phrase_cache.get_or_synthesize(self.tts_backend, text)
+                    with tracer.span("tts.playback", audio_seconds=len(samples) / rate):
+                        self.play_pcm(samples, rate)
+                else:
+                    self.tts_backend.speak(text)
+                span.set_attribute("interrupted", self.playback_interrupted.is_set())
+        finally:
+            self.speaking.clear()
+            self.playback_levels.clear()
+        return not self.playback_interrupted.is_set()
+            
+    def play_pcm(self, samples: np.ndarray, rate: int) -> None:
+        # Output streams are kept open per sample rate, so replies don't pay for opening the device
+        if rate not in self.output_streams:
+            self.audio = self.audio or PyAudio()
+            self.output_streams[rate] = self.audio.open(format=AudioManager.FORMAT, channels=AudioManager.CHANNELS, rate=rate, output=True)
+        output = self.output_streams[rate]
+        
+        for start in range(0, len(samples), AudioManager.CHUNK):
+            if self.playback_interrupted.is_set():
+                break
+            chunk = samples[start:start + AudioManager.CHUNK]
+            if self.playback_gain != 1.0:
+                chunk = (chunk * self.playback_gain).astype(np.int16)
+            # What the mic should expect to hear of the reply, for barge-in echo suppression
+            self.playback_levels.append(float(np.abs(chunk).mean()))
+            output.write(chunk.tobytes())
         
     def frames_to_wav(self, frames: list, output_filename) -> None:
         waveFile = wave.open(output_filename, 'wb')
         waveFile.setnchannels(AudioManager.CHANNELS)
-        waveFile.setsampwidth(self.audio.get_sample_size(AudioManager.FORMAT))
+        # FORMAT is 16 bit
+        waveFile.setsampwidth(2)
         waveFile.setframerate(AudioManager.RATE)
         waveFile.writeframes(b''.join(frames))
         waveFile.close()
     
+    @staticmethod
+    def frames_to_float32(frames: list) -> np.ndarray:
+        """Converts raw int16 PCM frames to the normalized float32 mono array whisper expects."""
+        return np.frombuffer(b''.join(frames), dtype=np.int16).astype(np.float32) / 32768.0
+    
     def save_temp_wav_file(self, frames: list) -> str:
         tmp = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
         tmp.close()
@@ -179,7 +482,11 @@ class AudioManager:
     def stop(self):
         self.stream.stop_stream()
         self.stream.close()
-        self.audio.terminate()
+        for output in self.output_streams.values():
+            output.close()
+        if self.audio is not None:
+            self.audio.terminate()
+        self.ring_buffer.close()
             
 if __name__ == "__main__":
     jarvis_model_path = "/Users/sam/Library/CloudStorage/OneDrive-TimothyChristianSchool/Stem Internship/Microsoft/NL Action Engine/.venv/lib/python3.13/site-packages/openwakeword/resources/models/hey_jarvis_v0.1.onnx"
@@ -0,0 +1,107 @@
+from collections import deque
+import numpy as np
+
+
+class Endpointer:
+    """
+    Decides when a spoken request starts and ends, one mic chunk at a time.
+
+    Subclasses only have to say whether a chunk is speech; the base class handles the adaptive noise floor,
+    the hangover (how much trailing non-speech ends a request), the max utterance cap and how long to wait for
+    speech to start at all (after a false wake word, nobody says anything).
+    """
+
+    def __init__(
+        self,
+        rate: int,
+        hangover_seconds: float = 0.8,
+        max_utterance_seconds: float = 15.0,
+        max_wait_for_speech_seconds: float = 5.0,
+        noise_floor_margin: float = 2.0,
+        min_speech_level: float = 300.0,
+        noise_window_seconds: float = 3.0,
+    ):
+        self.rate = rate
+        self.hangover_seconds = hangover_seconds
+        self.max_utterance_seconds = max_utterance_seconds
+        self.max_wait_for_speech_seconds = max_wait_for_speech_seconds
+        # A chunk has to be this many times louder than the background noise to count as speech
+        self.noise_floor_margin = noise_floor_margin
+        self.min_speech_level = min_speech_level
+        self.noise_window_seconds = noise_window_seconds
+
+        self.noise_floor = min_speech_level / noise_floor_margin
+        # Sized on the first chunk, once the chunk length is known
+        self.recent_levels = deque()
+        self.reset()
+
+    def reset(self) -> None:
+        """Resets the per-request state. The noise floor is kept, since the room doesn't change between requests."""
+        self.started = False
+        self.silent_samples = 0
+        self.speech_samples = 0
+        self.waited_samples = 0
+
+    def is_speech(self, chunk: np.ndarray, level: float) -> bool:
+        raise NotImplementedError
+
+    def update(self, chunk: np.ndarray) -> bool:
+        """
+        Feeds the next chunk of int16 audio. Returns True once the request has ended, or if no speech started
+        within `max_wait_for_speech_seconds` (`started` is then still False).
+        """
+        level = float(np.abs(chunk).mean())
+        # Minimum statistics: the quietest chunk of the last few seconds is the background level, since even
+        # continuous speech has short pauses. A steady hum (fan, TV) then raises the floor instead of counting as speech
+        if self.recent_levels.maxlen is None:
+            self.recent_levels = deque(self.recent_levels, maxlen=max(1, int(self.noise_window_seconds * self.rate / len(chunk))))
+        self.recent_levels.append(level)
+        self.noise_floor = min(self.recent_levels)
+
+        loud_enough = level > max(self.min_speech_level, self.noise_floor * self.noise_floor_margin)
+        # is_speech runs on every chunk so stateful detectors see continuous audio
+        speech = self.is_speech(chunk, level) and loud_enough
+
+        if speech:
+            self.started = True
+            self.silent_samples = 0
+        elif self.started:
+            self.silent_samples += len(chunk)
+        else:
+            self.waited_samples += len(chunk)
+            if self.waited_samples >= self.max_wait_for_speech_seconds * self.rate:
+                return True
+
+        if self.started:
+            self.speech_samples += len(chunk)
+            if self.silent_samples >= self.hangover_seconds * self.rate:
+                return True
+            if self.speech_samples >= self.max_utterance_seconds * self.rate:
+                return True
+        return False
+
+
+class EnergyEndpointer(Endpointer):
+    """Treats anything sufficiently above the adaptive noise floor as speech."""
+
+    def is_speech(self, chunk: np.ndarray, level: float) -> bool:
+        return True
+
+
+class VADEndpointer(Endpointer):
+    """Uses the Silero VAD model bundled with openWakeWord for per-chunk voice activity probabilities."""
+
+    def __init__(self, rate: int, vad_threshold: float = 0.5, **kwargs):
+        from openwakeword.vad import VAD
+
+        # Separate instance from the wake word model's VAD, so the two don't share recurrent state
+        self.vad = VAD()
+        self.vad_threshold = vad_threshold
+        super().__init__(rate, **kwargs)
+
+    def reset(self) -> None:
+        super().reset()
+        self.vad.reset_states()
+
+    def is_speech(self, chunk: np.ndarray, level: float) -> bool:
+        return self.vad.predict(chunk) >= self.vad_threshold
@@ -0,0 +1,152 @@
+from dataclasses import dataclass
+from typing import Optional
+from httpx import HTTPStatusError, TransportError
+from semantic_kernel.filters import FunctionInvocationContext
+from semantic_kernel.functions import FunctionResult
+
+import asyncio
+import logging
+import time
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Set in the metadata of results the guard made up instead of the function, so they aren't cached as real answers
+GUARD_METADATA_KEY = "function_guard"
+
+
+def is_outage(error) -> bool:
+    """
+    Whether an error means the service behind a function is down or unreachable: a timeout, a transport error
+    or a 5xx response. Errors caused by the request itself, such as a 404 for an unknown city or a KeyError on
+    its error body, would fail again right away however healthy the service, so they don't count.
+    """
+    if isinstance(error, HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, (TransportError, asyncio.TimeoutError))
+
+
+@dataclass(slots=True)
+class CircuitBreaker:
+    """
+    Consecutive failures of one function. After `failure_threshold` in a row the circuit opens and calls fail
+    immediately for `reset_seconds`; then one trial call is let through, which closes it again if it succeeds.
+    """
+
+    failure_threshold: int
+    reset_seconds: float
+    failures: int = 0
+    opened_at: Optional[float] = None
+    trial_running: bool = False
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self.trial_running or time.monotonic() - self.opened_at < self.reset_seconds:
+            return False
+        self.trial_running = True
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.trial_running = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def record_inconclusive(self) -> None:
+        """Ends a call that says nothing about the service's health, e.g. one that was cancelled."""
+        self.trial_running = False
+
+    @property
+    def retry_in(self) -> float:
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at)) if self.opened_at is not None else 0.0
+
+
+class FunctionGuard:
+    """
+    A kernel function invocation filter that gives every function call a deadline and a circuit breaker, so a
+    hung Hue bridge or weather API can't stall the conversation. Calls that time out, or raise or return an
+    error that means the service is down (see `is_outage`), count towards opening the circuit. A call that runs past its deadline is cancelled,
+    and one whose circuit is open isn't made at all; either way the caller (usually the LLM) gets a structured
+    result such as {"error": "timeout", "function": ..., "timeout_seconds": ...} it can explain to the user.
+
+    `timeouts` overrides `default_timeout` per function, keyed by fully qualified name ("Weather-get_weather_info").
+    Semantic Kernel already runs the tool calls of one LLM turn concurrently, so the turn takes as long as its
+    slowest call, which this bounds.
+    """
+
+    def __init__(
+        self,
+        default_timeout: float = 8.0,
+        timeouts: Optional[dict[str, float]] = None,
+        failure_threshold: int = 3,
+        reset_seconds: float = 30.0,
+    ):
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts or {}
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.breakers: dict[str, CircuitBreaker] = {}
+
+    def timeout_for(self, name: str) -> float:
+        return self.timeouts.get(name, self.default_timeout)
+
+    def breaker_for(self, name: str) -> CircuitBreaker:
+        if name not in self.breakers:
+            self.breakers[name] = CircuitBreaker(self.failure_threshold, self.reset_seconds)
+        return self.breakers[name]
+
+    async def __call__(self, context: FunctionInvocationContext, next) -> None:
+        name = context.function.fully_qualified_name
+        breaker = self.breaker_for(name)
+
+        if not breaker.allow():
+            logger.warning("Skipping %s: it failed %d times in a row", name, breaker.failures)
+            self._fail(context, {
+                "error": "unavailable",
+                "function": name,
+                "message": f"{name} is not responding, so it wasn't called. Try again in {breaker.retry_in:.0f} seconds.",
+            })
+            return
+
+        timeout = self.timeout_for(name)
+        # None when the call says nothing about the service's health: it was cancelled, or its arguments were bad
+        failed = None
+        try:
+            await asyncio.wait_for(next(context), timeout)
+            value = context.result.value if context.result else None
+            # The Hue plugin returns its HTTPError instead of raising it
+            failed = (True if is_outage(value) else None) if isinstance(value, Exception) else False
+        except asyncio.TimeoutError:
+            failed = True
+            logger.warning("%s timed out after %.1f s", name, timeout)
+            self._fail(context, {
+                "error": "timeout",
+                "function": name,
+                "timeout_seconds": timeout,
+                "message": f"{name} did not respond within {timeout:g} seconds.",
+            })
+        except Exception as e:
+            failed = True if is_outage(e) else None
+            raise
+        finally:
+            # Also runs on cancellation, so a cancelled trial call doesn't leave the circuit half open for good
+            if failed:
+                breaker.record_failure()
+            elif failed is None:
+                breaker.record_inconclusive()
+            else:
+                breaker.record_success()
+
+    def _fail(self, context: FunctionInvocationContext, value: dict) -> None:
+        tracer.current_span().set_attribute("error", value["error"])
+        context.result = FunctionResult(function=context.function.metadata, value=value, metadata={GUARD_METADATA_KEY: value["error"]})
@@ -0,0 +1,113 @@
+from typing import Optional
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.contents import ChatHistory, ChatMessageContent, FunctionCallContent, FunctionResultContent, AuthorRole
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+class HistoryManager:
+    """
+    Keeps a ChatHistory within a token budget before it is sent to the model.
+
+    Messages are grouped into turns, each starting at a user message, and the oldest turns are dropped first.
+    A turn holds every tool call and tool result the model made while answering, so a call is never separated
+    from its result. With a summary service, dropped turns are folded into a running summary that is kept at
+    the start of the history instead of being forgotten.
+    """
+
+    SUMMARY_KEY = "history_summary"
+    # Roughly what the chat format adds per message on top of its text
+    MESSAGE_OVERHEAD = 4
+
+    def __init__(
+        self,
+        max_tokens: int = 3000,
+        summary_service: Optional[ChatCompletionClientBase] = None,
+        summary_tokens: int = 200,
+        encoding_name: str = "cl100k_base",
+    ):
+        self.max_tokens = max_tokens
+        self.summary_service = summary_service
+        # Budget reserved for the running summary when summarization is on
+        self.summary_tokens = summary_tokens
+        # Falls back to ~4 characters per token when tiktoken isn't installed
+        self.encoding = tiktoken.get_encoding(encoding_name) if tiktoken else None
+
+    def count_tokens(self, text: str) -> int:
+        if self.encoding:
+            return len(self.encoding.encode(text))
+        return (len(text) + 3) // 4
+
+    def count_message_tokens(self, message: ChatMessageContent) -> int:
+        parts = [message.content or ""]
+        for item in message.items:
+            if isinstance(item, FunctionCallContent):
+                parts.append(f"{item.name}({item.arguments})")
+            elif isinstance(item, FunctionResultContent):
+                parts.append(str(item.result))
+        return HistoryManager.MESSAGE_OVERHEAD + self.count_tokens(" ".join(parts))
+
+    def count_history_tokens(self, history: ChatHistory) -> int:
+        return sum(self.count_message_tokens(message) for message in history.messages)
+
+    async def compact(self, history: ChatHistory) -> None:
+        """Trims `history` in place until it fits in max_tokens, always keeping the latest turn."""
+        if self.count_history_tokens(history) <= self.max_tokens:
+            return
+
+        pinned, summary, turns = self._split(history)
+        budget = self.max_tokens - sum(self.count_message_tokens(message) for message in pinned)
+        if self.summary_service:
+            budget -= self.summary_tokens
+        elif summary:
+            budget -= self.count_message_tokens(summary)
+
+        kept = []
+        for turn in reversed(turns):
+            cost = sum(self.count_message_tokens(message) for message in turn)
+            if kept and cost > budget:
+                break
+            kept.insert(0, turn)
+            budget -= cost
+        dropped = turns[:len(turns) - len(kept)]
+
+        if dropped and self.summary_service:
+            summary = await self._summarize(summary, [message for turn in dropped for message in turn])
+
+        history.messages = pinned + ([summary] if summary else []) + [message for turn in kept for message in turn]
+
+    def _split(self, history: ChatHistory) -> tuple[list, Optional[ChatMessageContent], list[list]]:
+        """Splits a history into leading system messages, the running summary (if any) and user turns."""
+        pinned, summary, turns = [], None, []
+        for message in history.messages:
+            if message.metadata.get(HistoryManager.SUMMARY_KEY):
+                summary = message
+            elif message.role == AuthorRole.USER or (turns and message.role != AuthorRole.SYSTEM):
+                if message.role == AuthorRole.USER:
+                    turns.append([])
+                turns[-1].append(message)
+            else:
+                pinned.append(message)
+        return pinned, summary, turns
+
+    async def _summarize(self, summary: Optional[ChatMessageContent], messages: list[ChatMessageContent]) -> ChatMessageContent:
+        transcript = "\n".join(
+            f"{message.role.value}: {message.content}" for message in messages if message.content
+        )
+        prompt = ChatHistory()
+        prompt.add_system_message(
+            f"Summarize this conversation between a user and a home assistant in under {self.summary_tokens // 2} words. "
+            "Keep names, rooms, light states and preferences that later requests may refer to."
+        )
+        prompt.add_user_message((f"Earlier summary: {summary.content}\n\n" if summary else "") + transcript)
+
+        result = await self.summary_service.get_chat_message_content(chat_history=prompt, settings=PromptExecutionSettings())
+        return ChatMessageContent(
+            role=AuthorRole.SYSTEM,
+            content=f"Summary of the earlier conversation: {result}",
+            metadata={HistoryManager.SUMMARY_KEY: True},
+        )
@@ -0,0 +1,143 @@
+from typing import Awaitable, Callable, Optional
+from semantic_kernel import Kernel
+from semantic_kernel.functions import KernelArguments
+
+import logging
+import re
+
+from plugins.hue_registry import HueRegistry
+
+logger = logging.getLogger(__name__)
+
+# Filler Whisper and users tend to wrap commands in
+_FILLER = re.compile(r"^(?:hey jarvis |jarvis |please |can you |could you |would you )+|(?: please| for me| thanks| thank you)+$")
+
+
+def normalize(text: str) -> str:
+    """Lower-cases a transcript and strips punctuation so it can be matched against the grammars."""
+    text = re.sub(r"[^\w\s'%]", " ", text.lower())
+    text = " ".join(text.split())
+    return _FILLER.sub("", text).strip()
+
+
+class IntentRouter:
+    """
+    Fast path for common commands that can be answered without the LLM.
+
+    Each intent is a compiled grammar over the normalized transcript. A match is only acted on when it resolves
+    to exactly one target (e.g. one room or one light); anything else returns None so the request goes to the LLM.
+    Matched intents call the plugins' kernel functions through the kernel, the same way the LLM would.
+    """
+
+    def __init__(self, kernel: Kernel, lights_registry: Optional[HueRegistry] = None, lights_plugin_name: str = "Lights", weather_plugin_name: str = "Weather"):
+        self.kernel = kernel
+        self.lights_registry = lights_registry
+        self.lights_plugin_name = lights_plugin_name
+        self.weather_plugin_name = weather_plugin_name
+
+        self.intents: list[tuple[re.Pattern, Callable[[re.Match], Awaitable[Optional[str]]]]] = []
+        if lights_registry is not None:
+            self.intents += [
+                (re.compile(r"^(?:turn|switch) (?P<state>on|off) (?:all )?(?:the )?(?P<target>.+?)(?: lights?| lamps?)?$"), self._turn_on_off),
+                (re.compile(r"^(?:turn|switch) (?:all )?(?:the )?(?P<target>.+?)(?: lights?| lamps?)? (?P<state>on|off)$"), self._turn_on_off),
+                (re.compile(r"^(?:set|dim|brighten|turn) (?:all )?(?:the )?(?P<target>.+?)(?: lights?| lamps?)? (?:to|at) (?P<level>\d{1,3}) ?(?:%|percent)?$"), self._set_brightness),
+            ]
+        self.intents += [
+            (re.compile(r"^(?:what's|what is|how's|how is) the weather(?: like)? in (?P<city>[a-z' ]+?)(?: today| right now| now)?$"), self._weather),
+            (re.compile(r"^weather in (?P<city>[a-z' ]+)$"), self._weather),
+        ]
+
+    async def route(self, user_message: str) -> Optional[str]:
+        """Returns the reply if a high-confidence intent handled the request, otherwise None."""
+        text = normalize(user_message)
+        for pattern, handler in self.intents:
+            match = pattern.match(text)
+            if not match:
+                continue
+            try:
+                reply = await handler(match)
+            except Exception:
+                # Let the LLM deal with anything unexpected, e.g. a city the weather API doesn't know
+                logger.debug("Fast path intent failed, falling back to the LLM", exc_info=True)
+                return None
+            if reply is not None:
+                return reply
+        return None
+
+    # --- Target resolution ---
+
+    def _resolve_lights_target(self, target: str) -> Optional[tuple[str, str, str]]:
+        """Resolves a spoken target to ("group" | "light", id, name), only if exactly one group or light matches."""
+        target = target.strip()
+        if target in ("all", "every", "everything", "house", "the house"):
+            target = "all lights"
+
+        group = self.lights_registry.get_group(target)
+        if group:
+            return ("group", group.id, group.name)
+        light = self.lights_registry.get_light(target)
+        if light:
+            return ("light", light.id, light.name)
+
+        # Otherwise every spoken word must appear in the name ("bedroom" -> "Sam's Bedroom")
+        words = set(target.replace("'s", "").split())
+        groups = [g for g in self.lights_registry.groups.values() if words <= set(normalize(g.name).replace("'s", "").split())]
+        if len(groups) == 1:
+            return ("group", groups[0].id, groups[0].name)
+        if groups:
+            return None
+        lights = [l for l in self.lights_registry.lights.values() if words <= set(normalize(l.name.replace("-", " ")).split())]
+        if len(lights) == 1:
+            return ("light", lights[0].id, lights[0].name)
+        return None
+
+    async def _change_lights(self, target: str, new_state: dict) -> Optional[tuple[object, str]]:
+        resolved = self._resolve_lights_target(target)
+        if resolved is None:
+            return None
+        kind, id, name = resolved
+
+        if kind == "group":
+            result = await self.kernel.invoke(plugin_name=self.lights_plugin_name, function_name="change_group_state", arguments=KernelArguments(id=id, new_group_state=new_state))
+        else:
+            result = await self.kernel.invoke(plugin_name=self.lights_plugin_name, function_name="change_light_state", arguments=KernelArguments(id=id, new_light_state=new_state))
+        return (result.value if result else None, name)
+
+    # --- Intents ---
+
+    async def _turn_on_off(self, match: re.Match) -> Optional[str]:
+        state = match["state"]
+        changed = await self._change_lights(match["target"], {"is_on": state == "on"})
+        if changed is None:
+            return None
+        value, name = changed
+        if not isinstance(value, dict) or "error" in value:
+            return f"Sorry, I couldn't change {name} right now."
+        return f"Okay, I turned {state} {name}."
+
+    async def _set_brightness(self, match: re.Match) -> Optional[str]:
+        level = int(match["level"])
+        if level > 100:
+            return None
+        changed = await self._change_lights(match["target"], {"is_on": level > 0, "brightness": float(level)})
+        if changed is None:
+            return None
+        value, name = changed
+        if not isinstance(value, dict) or "error" in value:
+            return f"Sorry, I couldn't change {name} right now."
+        return f"Okay, {name} set to {level} percent."
+
+    async def _weather(self, match: re.Match) -> Optional[str]:
+        city = match["city"].strip()
+        result = await self.kernel.invoke(plugin_name=self.weather_plugin_name, function_name="get_weather_info", arguments=KernelArguments(city=city))
+        weather = result.value if result else None
+        # Including a timed out call (see FunctionGuard), which the LLM can explain better
+        if not weather or "error" in weather:
+            return None
+
+        reply = f"It's {weather['current_temp']} degrees and {weather['desc']} in {weather['name']}"
+        if weather["feels_like"] != weather["current_temp"]:
+            reply += f", feeling like {weather['feels_like']}"
+        if weather["low"] is not None:
+            reply += f". Today's low is {weather['low']} and the high is {weather['high']}"
+        return reply + "."
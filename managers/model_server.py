@@ -0,0 +1,198 @@
+from concurrent.futures import Future
+from multiprocessing import Process
+from multiprocessing.managers import BaseManager
+
+import argparse
+import ipaddress
+import os
+import queue
+import secrets
+import socket
+import threading
+import time
+import numpy as np
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.stt import STTBackend, WhisperBackend, make_stt_backend
+
+DEFAULT_ADDRESS = ("127.0.0.1", 50055)
+# Without MODEL_SERVER_AUTHKEY, the server and its clients share a random key kept here, readable only by its owner
+AUTHKEY_FILE = os.path.join(os.path.expanduser("~"), ".nl_action_engine", "model_server_authkey")
+
+
+class BatchedWhisper(WhisperBackend):
+    """
+    A Whisper model shared by many callers (rooms, or front-ends of a model server) that decodes concurrent
+    requests together. Requests arriving within `max_wait_seconds` of each other are padded to Whisper's 30 second
+    window and decoded as one batch, which costs little more than decoding one of them.
+
+    Audio longer than one window, file paths and calls with extra options (e.g. streaming's initial_prompt) go
+    through the regular sequential transcribe.
+    """
+
+    def __init__(self, model_name: str, max_batch_size: int = 8, max_wait_seconds: float = 0.05, threads: int | None = None, language: str | None = None):
+        super().__init__(model_name, threads=threads, language=language)
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.requests = queue.Queue()
+        threading.Thread(target=self._run, name="whisper-batcher", daemon=True).start()
+
+    def transcribe(self, audio, **kwargs) -> dict:
+        if kwargs or isinstance(audio, str) or len(audio) > self.whisper.audio.N_SAMPLES:
+            return super().transcribe(audio, **kwargs)
+
+        future = Future()
+        self.requests.put((audio, future))
+        return future.result()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.monotonic() + self.max_wait_seconds
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self.requests.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+
+            try:
+                results = self._decode_batch([audio for audio, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+
+    def _decode_batch(self, audios: list) -> list[dict]:
+        import torch
+
+        mel = torch.stack([
+            self.whisper.log_mel_spectrogram(self.whisper.pad_or_trim(np.asarray(audio, dtype=np.float32)), n_mels=self.model.dims.n_mels)
+            for audio in audios
+        ]).to(self.model.device)
+        with self.lock:
+            results = self.whisper.decode(self.model, mel, self.whisper.DecodingOptions(fp16=False, language=self.language))
+        return [{"text": result.text, "language": result.language} for result in results]
+
+
+class ModelServerManager(BaseManager):
+    pass
+
+
+class RemoteWhisper(STTBackend):
+    """
+    A speech to text model resident in a model server process (see `serve`), shared by every front-end that connects.
+    Front-ends skip loading the model entirely, so they start instantly and memory holds one copy of it.
+    """
+
+    name = "remote"
+
+    def __init__(self, address: tuple[str, int] = DEFAULT_ADDRESS, authkey: bytes | None = None):
+        super().__init__()
+        self.address = address
+        self.authkey = authkey or _default_authkey()
+        ModelServerManager.register("whisper")
+        # Manager proxies must not be shared between threads, so each thread gets its own connection
+        self.local = threading.local()
+        # Connect once up front so a missing server is reported at startup
+        self._proxy()
+
+    def _proxy(self):
+        if not hasattr(self.local, "proxy"):
+            manager = ModelServerManager(address=self.address, authkey=self.authkey)
+            manager.connect()
+            self.local.proxy = manager.whisper()
+        return self.local.proxy
+
+    def transcribe(self, audio, **kwargs) -> dict:
+        return self._proxy().transcribe(audio, **kwargs)
+
+
+def serve(
+    whisper_model_name: str,
+    address: tuple[str, int] = DEFAULT_ADDRESS,
+    authkey: bytes | None = None,
+    backend: str = "whisper",
+    threads: int | None = None,
+    language: str | None = None,
+) -> None:
+    """
+    Loads the speech to text model once and serves it to RemoteWhisper clients until the process is killed.
+    With openai-whisper, requests from different clients that arrive together are decoded as one batch.
+    """
+    # The manager protocol unpickles requests, so anyone who has the key can run code in this process
+    if not authkey and not os.getenv("MODEL_SERVER_AUTHKEY") and not _is_loopback(address[0]):
+        raise ValueError(f"Set MODEL_SERVER_AUTHKEY (or pass authkey) to serve on {address[0]}; the generated key is only for clients on this machine")
+
+    if backend == WhisperBackend.name:
+        stt_backend = BatchedWhisper(whisper_model_name, threads=threads, language=language)
+    else:
+        stt_backend = make_stt_backend(backend, whisper_model_name, threads=threads, language=language)
+    ModelServerManager.register("whisper", callable=lambda: stt_backend)
+
+    manager = ModelServerManager(address=address, authkey=authkey or _default_authkey())
+    print(f"Serving {backend} '{whisper_model_name}' on {address[0]}:{address[1]}")
+    manager.get_server().serve_forever()
+
+
+def start_server_process(whisper_model_name: str, address: tuple[str, int] = DEFAULT_ADDRESS, authkey: bytes | None = None, **options) -> Process:
+    """Runs `serve` in a background daemon process."""
+    process = Process(target=serve, args=(whisper_model_name, address, authkey), kwargs=options, daemon=True)
+    process.start()
+    return process
+
+
+def _default_authkey() -> bytes:
+    """MODEL_SERVER_AUTHKEY, or else the key in AUTHKEY_FILE, which is generated on first use."""
+    if os.getenv("MODEL_SERVER_AUTHKEY"):
+        return os.getenv("MODEL_SERVER_AUTHKEY").encode()
+    try:
+        with open(AUTHKEY_FILE, "rb") as file:
+            return file.read().strip()
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(os.path.dirname(AUTHKEY_FILE), mode=0o700, exist_ok=True)
+    key = secrets.token_hex(32).encode()
+    # Written in full under a temporary name and then linked into place, so a server and a client starting at
+    # the same time can't read a half written key or each keep a different one
+    temporary = f"{AUTHKEY_FILE}.{os.getpid()}"
+    fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as file:
+        file.write(key)
+    try:
+        os.link(temporary, AUTHKEY_FILE)
+    except FileExistsError:
+        with open(AUTHKEY_FILE, "rb") as file:
+            key = file.read().strip()
+    finally:
+        os.unlink(temporary)
+    return key
+
+
+def _is_loopback(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        pass
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except OSError:
+        return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep a speech to text model loaded for several AudioManager front-ends.")
+    parser.add_argument("--whisper-model", default="tiny")
+    parser.add_argument("--backend", default=WhisperBackend.name, help="whisper or faster-whisper")
+    parser.add_argument("--threads", type=int)
+    parser.add_argument("--language", help="Pin the spoken language, e.g. en, to skip language detection")
+    parser.add_argument("--host", default=DEFAULT_ADDRESS[0], help="Other than loopback, MODEL_SERVER_AUTHKEY must be set")
+    parser.add_argument("--port", type=int, default=DEFAULT_ADDRESS[1])
+    args = parser.parse_args()
+
+    if not os.getenv("MODEL_SERVER_AUTHKEY") and not _is_loopback(args.host):
+        parser.error(f"set MODEL_SERVER_AUTHKEY to serve on {args.host}")
+    serve(args.whisper_model, (args.host, args.port), backend=args.backend, threads=args.threads, language=args.language)
@@ -0,0 +1,212 @@
+from dataclasses import dataclass
+from typing import Optional
+from collections import OrderedDict
+from semantic_kernel import Kernel
+from semantic_kernel.contents import ChatMessageContent, FunctionCallContent, FunctionResultContent
+from semantic_kernel.functions import KernelArguments
+
+import hashlib
+import math
+import re
+import time
+
+from managers.function_guard import GUARD_METADATA_KEY
+from managers.intent_router import normalize
+
+
+# Words that point back at something said earlier, as in "turn it off" or "do that again"
+BACK_REFERENCES = {"it", "them", "that", "those", "there", "again", "same"}
+# ...unless they are the empty subject of "is it cold" or "will there be rain"
+_EMPTY_SUBJECT_NEIGHBOURS = {"is", "was", "will", "would", "does", "did", "be", "s"}
+# Functions that only read state, so they can be replayed to check a plan before anything is changed
+READ_ONLY_PREFIXES = ("get_",)
+
+
+def refers_back(key: str) -> bool:
+    """Whether a normalized transcript depends on an earlier turn for its meaning."""
+    words = re.split(r"[\s']+", key)
+    for i, word in enumerate(words):
+        if word not in BACK_REFERENCES:
+            continue
+        neighbours = {words[i - 1] if i else "", words[i + 1] if i + 1 < len(words) else ""}
+        if word in ("it", "there") and neighbours & _EMPTY_SUBJECT_NEIGHBOURS:
+            continue
+        return True
+    return False
+
+
+@dataclass(slots=True)
+class PlannedCall:
+    plugin_name: str
+    function_name: str
+    arguments: dict
+    # str() of the result the call returned when the plan was recorded
+    result: str
+
+
+@dataclass(slots=True)
+class CachedPlan:
+    calls: list[PlannedCall]
+    reply: str
+    expires_at: float
+    embedding: Optional[list[float]] = None
+
+
+class PlanCache:
+    """
+    Caches the kernel function calls the LLM planned for a request, keyed on the normalized transcript.
+
+    A hit replays those calls against the live plugins without contacting the model. If every call returns the
+    same result as when the plan was recorded (always true for "turn off the kitchen lights"), the recorded reply
+    is still accurate and is reused. If a result changed (the weather moved on), the hit is dropped and the request
+    goes to the LLM, which records a fresh plan. Read-only calls are replayed first, so a changed result is found
+    before any call that changes something is made. Only requests that called at least one function are cached,
+    and only if they stand on their own (see `record`), since a plan for "turn it off" is only right in context.
+
+    With an embedding service, a transcript with no exact match can also hit the most similar cached transcript
+    above `similarity_threshold`. The cache is cleared whenever the kernel's set of plugins or functions changes.
+    """
+
+    def __init__(self, max_entries: int = 128, ttl_seconds: float = 3600.0, embedding_service=None, similarity_threshold: float = 0.93):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embedding_service = embedding_service
+        self.similarity_threshold = similarity_threshold
+        self.entries: OrderedDict[str, CachedPlan] = OrderedDict()
+        self.plugins_fingerprint: Optional[str] = None
+
+    # --- Lookup ---
+
+    async def replay(self, kernel: Kernel, user_message: str) -> Optional[str]:
+        """Replays a cached plan for `user_message` and returns its reply, or None on a miss."""
+        self._check_plugins(kernel)
+        key = normalize(user_message)
+        if refers_back(key):
+            return None
+
+        plan = self._get(key) or await self._get_similar(key)
+        if plan is None:
+            return None
+
+        calls = sorted(plan.calls, key=lambda call: not call.function_name.startswith(READ_ONLY_PREFIXES))
+        for call in calls:
+            result = await kernel.invoke(plugin_name=call.plugin_name, function_name=call.function_name, arguments=KernelArguments(**call.arguments))
+            if str(result.value if result else None) != call.result:
+                self._drop(plan)
+                return None
+        return plan.reply
+
+    def _get(self, key: str) -> Optional[CachedPlan]:
+        plan = self.entries.get(key)
+        if plan is None:
+            return None
+        if plan.expires_at <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return plan
+
+    async def _get_similar(self, key: str) -> Optional[CachedPlan]:
+        if self.embedding_service is None or not self.entries:
+            return None
+        embedding = await self._embed(key)
+
+        best_key, best_score = None, self.similarity_threshold
+        for cached_key, plan in self.entries.items():
+            if plan.embedding is not None:
+                score = _cosine(embedding, plan.embedding)
+                if score >= best_score:
+                    best_key, best_score = cached_key, score
+        return self._get(best_key) if best_key else None
+
+    def _drop(self, plan: CachedPlan) -> None:
+        for key, cached in self.entries.items():
+            if cached is plan:
+                del self.entries[key]
+                return
+
+    # --- Recording ---
+
+    async def record(
+        self, kernel: Kernel, user_message: str, messages: list[ChatMessageContent], reply: str, earlier_messages: Optional[list[ChatMessageContent]] = None,
+    ) -> None:
+        """
+        Records the plan from the messages the LLM added while answering `user_message`. Requests that refer back
+        ("turn it off") aren't recorded. With `earlier_messages`, the history the model saw before the request, it
+        may also have taken a target from an earlier turn, so the plan is only recorded if every argument appears
+        in the request or in a result of an earlier call of the same plan.
+        """
+        self._check_plugins(kernel)
+        key = normalize(user_message)
+        if refers_back(key):
+            return
+
+        calls: dict[str, PlannedCall] = {}
+        for message in messages:
+            for item in message.items:
+                if isinstance(item, FunctionCallContent):
+                    calls[item.id] = PlannedCall(item.plugin_name, item.function_name, dict(item.to_kernel_arguments()), "")
+                elif isinstance(item, FunctionResultContent) and item.id in calls:
+                    # A timed out or skipped call didn't really happen, so there is no plan to replay
+                    if item.metadata.get(GUARD_METADATA_KEY):
+                        return
+                    calls[item.id].result = str(item.result)
+        if not calls or any(not call.result for call in calls.values()):
+            return
+        if earlier_messages and not _grounded(key, list(calls.values())):
+            return
+
+        embedding = await self._embed(key) if self.embedding_service else None
+        self.entries[key] = CachedPlan(list(calls.values()), reply, time.monotonic() + self.ttl_seconds, embedding)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def _check_plugins(self, kernel: Kernel) -> None:
+        """Clears the cache if plugins or their functions were added, removed or changed since the last check."""
+        signature = sorted(
+            (plugin_name, function.name, tuple(p.name for p in function.parameters))
+            for plugin_name, plugin in kernel.plugins.items()
+            for function in plugin.functions.values()
+        )
+        fingerprint = hashlib.sha1(repr(signature).encode()).hexdigest()
+        if fingerprint != self.plugins_fingerprint:
+            self.clear()
+            self.plugins_fingerprint = fingerprint
+
+    async def _embed(self, text: str) -> list[float]:
+        embeddings = await self.embedding_service.generate_embeddings([text])
+        return [float(x) for x in embeddings[0]]
+
+
+def _grounded(key: str, calls: list[PlannedCall]) -> bool:
+    """Whether every argument of `calls` appears in the request `key` or in the result of an earlier call."""
+    sources = [f" {key} "]
+    for call in calls:
+        for value in _argument_values(call.arguments):
+            if not any(f" {value} " in source for source in sources):
+                return False
+        sources.append(f" {normalize(call.result)} ")
+    return True
+
+
+def _argument_values(value) -> list[str]:
+    """Normalized strings and numbers in an argument; booleans such as is_on come from words like "off"."""
+    if isinstance(value, dict):
+        return [item for nested in value.values() for item in _argument_values(nested)]
+    if isinstance(value, (list, tuple)):
+        return [item for nested in value for item in _argument_values(nested)]
+    if isinstance(value, bool) or value is None:
+        return []
+    if isinstance(value, (int, float)):
+        return [f"{value:g}"]
+    return [normalize(str(value))] if normalize(str(value)) else []
+
+
+def _cosine(a: list[float], b: list[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
@@ -0,0 +1,98 @@
+import threading
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    Fixed-size, preallocated int16 ring buffer with a single writer and any number of readers.
+
+    The writer never takes a lock to store samples: it copies into the preallocated array and then
+    publishes the new write position. Each reader keeps its own cursor, so a slow reader can never
+    stall capture. If a reader falls more than `capacity` samples behind it skips ahead to the oldest
+    audio still held and the skipped samples are counted in `dropped`.
+    """
+
+    def __init__(self, capacity: int, dtype=np.int16):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=dtype)
+        # Total number of samples ever written; only the writer changes it
+        self.write_pos = 0
+        # Largest single write seen; the region the writer is about to fill is never safe to read
+        self.max_write = 0
+        # Only used to wake up waiting readers, never held while copying samples
+        self._new_data = threading.Condition()
+        self._closed = False
+
+    def write(self, samples: np.ndarray) -> None:
+        n = len(samples)
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            n = self.capacity
+        self.max_write = max(self.max_write, n)
+
+        start = self.write_pos % self.capacity
+        end = start + n
+        if end <= self.capacity:
+            self.buffer[start:end] = samples
+        else:
+            split = self.capacity - start
+            self.buffer[start:] = samples[:split]
+            self.buffer[:end - self.capacity] = samples[split:]
+
+        self.write_pos += n
+
+        with self._new_data:
+            self._new_data.notify_all()
+
+    def reader(self, from_latest: bool = True) -> "RingBufferReader":
+        return RingBufferReader(self, self.write_pos if from_latest else self.oldest_safe_pos())
+
+    def close(self) -> None:
+        self._closed = True
+        with self._new_data:
+            self._new_data.notify_all()
+
+    def oldest_safe_pos(self) -> int:
+        return max(0, self.write_pos - self.capacity + self.max_write)
+
+    def _copy(self, pos: int, n: int) -> np.ndarray:
+        start = pos % self.capacity
+        end = start + n
+        if end <= self.capacity:
+            return self.buffer[start:end].copy()
+        return np.concatenate((self.buffer[start:], self.buffer[:end - self.capacity]))
+
+
+class RingBufferReader:
+    def __init__(self, ring: AudioRingBuffer, pos: int):
+        self.ring = ring
+        self.pos = pos
+        self.dropped = 0
+
+    def available(self) -> int:
+        return self.ring.write_pos - self.pos
+
+    def skip_to_latest(self) -> None:
+        self.pos = self.ring.write_pos
+
+    def read(self, n: int, timeout: float | None = None) -> np.ndarray | None:
+        """Blocks until `n` samples are available and returns them, or None on timeout / close."""
+        with self.ring._new_data:
+            if not self.ring._new_data.wait_for(lambda: self.available() >= n or self.ring._closed, timeout):
+                return None
+        if self.available() < n:
+            return None
+
+        oldest = self.ring.oldest_safe_pos()
+        if self.pos < oldest:
+            self.dropped += oldest - self.pos
+            self.pos = oldest
+
+        samples = self.ring._copy(self.pos, n)
+
+        # The writer may have lapped us while copying; if so the copy is torn, so retry from the oldest audio
+        if self.pos < self.ring.oldest_safe_pos():
+            return self.read(n, timeout)
+
+        self.pos += n
+        return samples
@@ -0,0 +1,364 @@
+from dataclasses import dataclass, field
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pyaudio import paContinue, PyAudio
+from typing import Optional
+
+import argparse
+import asyncio
+import copy
+import logging
+import threading
+import time
+import numpy as np
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.audio_manager import AudioManager
+from managers.endpointing import Endpointer, EnergyEndpointer
+from managers.model_server import BatchedWhisper
+from managers.ring_buffer import AudioRingBuffer, RingBufferReader
+from managers.sk_manager import SKManager
+from managers.tts import TTSBackend, NullBackend
+from managers.tracing import tracer, run_in_executor
+
+logger = logging.getLogger(__name__)
+
+
+class BatchedWakeWord:
+    """
+    Wake word detection for many audio streams with one openWakeWord model.
+
+    openWakeWord's feature buffers are stateful, so every stream gets its own, but they share the model's
+    melspectrogram and embedding sessions. The wake word classifier then runs once per chunk on the stacked
+    features of every stream instead of once per stream.
+    """
+
+    # openWakeWord ignores the first few predictions after a reset, while its buffers are still filling
+    WARMUP_CHUNKS = 5
+
+    def __init__(self, wakeword_model_path: str, inference_framework: str = "onnx"):
+        from openwakeword.model import Model
+
+        self.model = Model(wakeword_models=[wakeword_model_path], inference_framework=inference_framework)
+        self.features = {}
+        self.chunks_seen = {}
+        # Cleared for a classifier exported with a fixed batch size of 1, which is then run per stream
+        self.batched = {name: True for name in self.model.models}
+
+    def reset(self, stream_id: str) -> None:
+        """Starts `stream_id` over with empty buffers. Not thread safe: call it from the thread that calls predict."""
+        self.features[stream_id] = self._new_features()
+        self.chunks_seen[stream_id] = 0
+
+    def _new_features(self):
+        # The model's own preprocessor is never fed audio, so its buffers are still in their initial state. A
+        # shallow copy shares its sessions, and each buffer is copied so streams don't share (and clear) them.
+        template = self.model.preprocessor
+        features = copy.copy(template)
+        for name, value in vars(template).items():
+            if isinstance(value, deque):
+                setattr(features, name, deque(value, maxlen=value.maxlen))
+            elif isinstance(value, np.ndarray):
+                setattr(features, name, value.copy())
+        return features
+
+    def predict(self, chunks: dict[str, np.ndarray]) -> dict[str, float]:
+        """Feeds one chunk of int16 audio per stream and returns each stream's highest wake word score."""
+        scores = {stream_id: 0.0 for stream_id in chunks}
+        ready = []
+        for stream_id, chunk in chunks.items():
+            if stream_id not in self.features:
+                self.reset(stream_id)
+            # Returns how many samples were turned into new features
+            if self.features[stream_id](chunk):
+                self.chunks_seen[stream_id] += 1
+                ready.append(stream_id)
+        if not ready:
+            return scores
+
+        for name in self.model.models:
+            batch = np.concatenate([self.features[stream_id].get_features(self.model.model_inputs[name]) for stream_id in ready]).astype(np.float32)
+            for stream_id, score in zip(ready, self._classify(name, batch)):
+                if self.chunks_seen[stream_id] > BatchedWakeWord.WARMUP_CHUNKS:
+                    scores[stream_id] = max(scores[stream_id], float(score))
+        return scores
+
+    def _classify(self, name: str, batch: np.ndarray) -> np.ndarray:
+        predict = self.model.model_prediction_function[name]
+        if self.batched[name]:
+            try:
+                return np.asarray(predict(batch)[0]).reshape(len(batch), -1)[:, 0]
+            except Exception:
+                logger.info("Wake word model %s doesn't accept batches, running it per stream", name)
+                self.batched[name] = False
+        return np.array([np.asarray(predict(batch[i:i + 1])[0]).ravel()[0] for i in range(len(batch))])
+
+
+@dataclass(eq=False)
+class Room:
+    name: str
+    sk_manager: SKManager
+    tts_backend: TTSBackend
+    ring_buffer: AudioRingBuffer
+    reader: RingBufferReader
+    # Only needs the noise floor, so no model is loaded per room
+    endpointer: Endpointer
+    # "wake" (listening for the wake word), "recording" or "busy" (answering)
+    state: str = "wake"
+    # Set once an answer is done; the audio thread then resets the room and goes back to "wake"
+    reset_pending: bool = False
+    frames: list = field(default_factory=list)
+    last_save: float = field(default_factory=time.time)
+    activation_times: list = field(default_factory=list)
+
+
+class RoomServer:
+    """
+    Serves several rooms from one process: one openWakeWord model and one Whisper model, however many rooms.
+
+    Each room's audio comes from a local input device or over a local socket (see `serve_sockets`) into its own
+    ring buffer. A single audio thread steps every room forward one chunk at a time, batching wake word
+    predictions across rooms, and recorded requests go to a shared batched Whisper queue. Each room keeps its
+    own SKManager, so conversations don't mix, while the plugins behind them are shared.
+    """
+
+    RATE = AudioManager.RATE
+    CHUNK = AudioManager.CHUNK
+
+    def __init__(
+        self,
+        wakeword_model_path: str,
+        whisper_model_name: str,
+        wake_word_threshold: float = 0.75,
+        inference_framework: str = "onnx",
+        ring_buffer_seconds: float = 10.0,
+        max_whisper_batch: int = 8,
+        stt_threads: Optional[int] = None,
+        language: Optional[str] = None,
+    ):
+        self.wake_word = BatchedWakeWord(wakeword_model_path, inference_framework)
+        self.whisper = BatchedWhisper(whisper_model_name, max_batch_size=max_whisper_batch, threads=stt_threads, language=language)
+        self.wake_word_threshold = wake_word_threshold
+        self.ring_buffer_seconds = ring_buffer_seconds
+
+        self.rooms: dict[str, Room] = {}
+        self.audio: Optional[PyAudio] = None
+        self.input_streams = []
+        self.running = threading.Event()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        # Enough workers that every room's request can be waiting in the same whisper batch
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+    def add_room(self, name: str, sk_manager: SKManager, device_index: Optional[int] = None, tts_backend: Optional[TTSBackend] = None) -> Room:
+        """Adds a room fed by the local input device `device_index`, or over a socket when it is None."""
+        ring_buffer = AudioRingBuffer(int(self.ring_buffer_seconds * RoomServer.RATE))
+        room = Room(
+            name=name,
+            sk_manager=sk_manager,
+            tts_backend=tts_backend or NullBackend(echo=True),
+            ring_buffer=ring_buffer,
+            reader=ring_buffer.reader(),
+            endpointer=EnergyEndpointer(RoomServer.RATE),
+        )
+        self.rooms[name] = room
+
+        if device_index is not None:
+            def capture_callback(in_data, frame_count, time_info, status):
+                ring_buffer.write(np.frombuffer(in_data, dtype=np.int16))
+                return (None, paContinue)
+
+            self.audio = self.audio or PyAudio()
+            self.input_streams.append(self.audio.open(
+                format=AudioManager.FORMAT,
+                channels=AudioManager.CHANNELS,
+                rate=RoomServer.RATE,
+                input=True,
+                input_device_index=device_index,
+                frames_per_buffer=RoomServer.CHUNK,
+                stream_callback=capture_callback,
+            ))
+        return room
+
+    # --- Socket input ---
+
+    async def serve_sockets(self, host: str = "127.0.0.1", port: int = 50056) -> asyncio.AbstractServer:
+        """
+        Accepts room audio over TCP. A client sends the room name and a newline, then streams raw 16 kHz mono
+        int16 PCM for as long as it is connected.
+        """
+        return await asyncio.start_server(self._handle_socket, host, port)
+
+    async def _handle_socket(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            name = (await reader.readline()).decode().strip()
+            room = self.rooms.get(name)
+            if room is None:
+                logger.warning("Rejected audio for unknown room %r", name)
+                return
+
+            remainder = b""
+            while data := await reader.read(RoomServer.CHUNK * 2):
+                data = remainder + data
+                # Samples are two bytes, so an odd byte waits for the next read
+                usable = len(data) - len(data) % 2
+                remainder = data[usable:]
+                if usable:
+                    room.ring_buffer.write(np.frombuffer(data[:usable], dtype=np.int16))
+        finally:
+            writer.close()
+
+    # --- Audio loop ---
+
+    def _audio_loop(self) -> None:
+        while self.running.is_set():
+            try:
+                if not self._step():
+                    time.sleep(0.01)
+            except Exception:
+                # One bad chunk or room mustn't stop every room from listening
+                logger.exception("Audio loop step failed")
+                time.sleep(0.1)
+
+    def _step(self) -> bool:
+        """Moves every room forward by one chunk. Returns False when no room had a chunk ready."""
+        chunks = {}
+        for room in self.rooms.values():
+            if room.reset_pending:
+                self._reset_room(room)
+            if room.reader.available() >= RoomServer.CHUNK:
+                chunk = room.reader.read(RoomServer.CHUNK, timeout=0)
+                if chunk is not None:
+                    chunks[room.name] = chunk
+        if not chunks:
+            return False
+
+        # Every room waiting for the wake word is scored in one batch
+        listening = {name: chunk for name, chunk in chunks.items() if self.rooms[name].state == "wake"}
+        if listening:
+            for name, score in self.wake_word.predict(listening).items():
+                if self._detect_wake_word(self.rooms[name], score):
+                    self._start_recording(self.rooms[name])
+
+        for name, chunk in chunks.items():
+            room = self.rooms[name]
+            if room.state != "recording" or name in listening:
+                continue
+            ended = room.endpointer.update(chunk)
+            if room.endpointer.started:
+                room.frames.append(chunk.tobytes())
+            if ended:
+                room.state = "busy"
+                asyncio.run_coroutine_threadsafe(self._answer(room, room.frames), self.loop)
+        return True
+
+    def _reset_room(self, room: Room) -> None:
+        # Audio that arrived while answering isn't fed to the wake word model
+        room.reader.skip_to_latest()
+        self.wake_word.reset(room.name)
+        room.reset_pending = False
+        room.state = "wake"
+
+    def _detect_wake_word(self, room: Room, score: float) -> bool:
+        # Same debouncing as AudioManager.detect_wake_word
+        cooldown = 2.5
+        save_delay = 0.1
+
+        if score >= self.wake_word_threshold:
+            room.activation_times.append(time.time())
+        if room.activation_times and (time.time() - room.last_save) >= cooldown and (time.time() - room.activation_times[0]) >= save_delay:
+            room.last_save = time.time()
+            room.activation_times = []
+            return True
+        return False
+
+    def _start_recording(self, room: Room) -> None:
+        print(f"\033[1;32m* [{room.name}] Listening...\033[0m")
+        room.state = "recording"
+        room.frames = []
+        room.endpointer.reset()
+
+    async def _answer(self, room: Room, frames: list) -> None:
+        try:
+            if not frames:
+                return
+            with tracer.span("utterance", room=room.name):
+                await self._answer_utterance(room, frames)
+        except Exception:
+            logger.exception("Request in room %s failed", room.name)
+        finally:
+            # The reader and wake word buffers belong to the audio thread, which resets them
+            room.reset_pending = True
+
+    async def _answer_utterance(self, room: Room, frames: list) -> None:
+        audio = AudioManager.frames_to_float32(frames)
+        with tracer.span("whisper", audio_seconds=len(audio) / RoomServer.RATE, batched=True):
+            user_message = (await run_in_executor(self.executor, self.whisper.transcribe, audio))["text"]
+        if not user_message.strip():
+            return
+        print(f"[{room.name}] You > {user_message}")
+
+        with tracer.span("request"):
+            result = await room.sk_manager.make_user_request(user_message)
+        print(f"[{room.name}] Assistant > {result}")
+        with tracer.span("tts", chars=len(str(result))):
+            await run_in_executor(self.executor, room.tts_backend.speak, str(result))
+
+    # --- Lifecycle ---
+
+    async def run(self, socket_host: str = "127.0.0.1", socket_port: Optional[int] = 50056) -> None:
+        """Serves every room until cancelled. With socket_port=None only local devices are used."""
+        self.loop = asyncio.get_running_loop()
+        self.executor = ThreadPoolExecutor(max_workers=max(2, 2 * len(self.rooms)), thread_name_prefix="room")
+        # The rooms share their plugins, so the plugins' setup and teardown only run once
+        sk_manager = next(iter(self.rooms.values())).sk_manager
+        await sk_manager.start()
+
+        server = await self.serve_sockets(socket_host, socket_port) if socket_port is not None else None
+        self.running.set()
+        audio_thread = threading.Thread(target=self._audio_loop, name="room-audio", daemon=True)
+        audio_thread.start()
+        print(f"Serving rooms: {', '.join(self.rooms)}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self.running.clear()
+            if server is not None:
+                server.close()
+            for stream in self.input_streams:
+                stream.stop_stream()
+                stream.close()
+            for room in self.rooms.values():
+                room.ring_buffer.close()
+            if self.audio is not None:
+                self.audio.terminate()
+            await sk_manager.close()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    from plugins.phillips_hue_lights_plugin import LightsPlugin
+    from plugins.weather_plugin import WeatherPlugin
+
+    parser = argparse.ArgumentParser(description="Serve several rooms' microphones from one process.")
+    parser.add_argument("--wakeword-model", required=True)
+    parser.add_argument("--whisper-model", default="tiny")
+    parser.add_argument("--room", action="append", required=True, metavar="NAME[=DEVICE_INDEX]",
+                        help="A room, fed by the given local input device, or over the socket without one")
+    parser.add_argument("--socket-port", type=int, default=50056)
+    parser.add_argument("--threads", type=int, help="CPU threads for whisper")
+    parser.add_argument("--language", help="Pin the spoken language, e.g. en, to skip language detection")
+    args = parser.parse_args()
+
+    plugins = [
+        {"plugin": LightsPlugin(), "plugin_name": "Lights"},
+        {"plugin": WeatherPlugin(), "plugin_name": "Weather"}
+    ]
+
+    room_server = RoomServer(args.wakeword_model, args.whisper_model, stt_threads=args.threads, language=args.language)
+    for room_arg in args.room:
+        name, _, device_index = room_arg.partition("=")
+        room_server.add_room(name, SKManager(plugins), int(device_index) if device_index else None)
+
+    asyncio.run(room_server.run(socket_port=args.socket_port))
@@ -1,22 +1,62 @@
 import semantic_kernel as sk
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
 from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
 from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents import ChatMessageContent, AuthorRole
 from semantic_kernel.connectors.ai.open_ai.prompt_execution_settings.azure_chat_prompt_execution_settings import AzureChatPromptExecutionSettings
+from semantic_kernel.filters import FilterTypes, FunctionInvocationContext
+from collections import Counter
+from typing import AsyncGenerator, Optional
 import logging
+import re
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from managers.function_guard import FunctionGuard
+from managers.history_manager import HistoryManager
+from managers.intent_router import IntentRouter
+from managers.plan_cache import PlanCache
+from managers.tracing import tracer, TracedChatCompletionMixin
 from plugins.weather_plugin import WeatherPlugin
 from plugins.phillips_hue_lights_plugin import LightsPlugin
 
+logger = logging.getLogger(__name__)
+
+# A sentence ends at . ! or ? followed by whitespace, so decimals like 72.5 aren't split
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+def split_sentences(text: str, keep_tail: bool = False) -> list[str]:
+    """
+    Splits text into sentences. With keep_tail, the last element is the unfinished text after the final
+    sentence break (possibly empty), for splitting a stream incrementally.
+    """
+    parts = _SENTENCE_END.split(text)
+    if keep_tail:
+        return [part.strip() for part in parts[:-1] if part.strip()] + [parts[-1]]
+    return [part.strip() for part in parts if part.strip()]
+
+class TracedAzureChatCompletion(TracedChatCompletionMixin, AzureChatCompletion):
+    """AzureChatCompletion that records a span for every round trip to the model."""
+
 class SKManager:
-    def __init__(self, plugins: list[dict]):
+    def __init__(
+        self,
+        plugins: list[dict],
+        max_history_tokens: int = 3000,
+        summarize_history: bool = False,
+        fast_path: bool = True,
+        cache_plans: bool = True,
+        chat_completion: Optional[ChatCompletionClientBase] = None,
+        function_timeout: float = 8.0,
+        function_timeouts: Optional[dict[str, float]] = None,
+    ):
         self.plugins = plugins
         
         self.kernel = sk.Kernel()
-        self.chat_completion = AzureChatCompletion()
+        # Azure OpenAI unless another service is given, e.g. fakes.chat_service.ScriptedChatCompletion for benchmarks
+        self.chat_completion = chat_completion or TracedAzureChatCompletion()
         
         self.kernel.add_service(self.chat_completion)
         
@@ -25,8 +65,27 @@ class SKManager:
         self.execution_setting.function_choice_behavior = FunctionChoiceBehavior.Auto()
         
         self.history = ChatHistory()
+        # Keeps prompt size bounded on a device that runs for weeks, optionally summarizing old turns
+        self.history_manager = HistoryManager(
+            max_tokens=max_history_tokens,
+            summary_service=self.chat_completion if summarize_history else None,
+        )
+        self.last_request_tokens = 0
         
         self.init_plugins()
+        # Times every kernel function call, whether the LLM, the fast path or the plan cache made it
+        self.kernel.add_filter(FilterTypes.FUNCTION_INVOCATION, self._trace_function_invocation)
+        # Deadlines and circuit breakers, so a hung bridge or API returns a timeout result instead of stalling the reply
+        self.function_guard = FunctionGuard(function_timeout, function_timeouts)
+        self.kernel.add_filter(FilterTypes.FUNCTION_INVOCATION, self.function_guard)
+        
+        # Common commands ("turn off the bedroom lights") are matched locally and skip the LLM entirely
+        self.router = IntentRouter(self.kernel, self._find_lights_registry()) if fast_path else None
+        # Replays the function calls the LLM planned for a repeated request without contacting the model
+        self.plan_cache = PlanCache() if cache_plans else None
+        # Which path ("fast", "cache" or "llm") served each request
+        self.last_request_path = None
+        self.path_counts = Counter()
     
     def init_plugins(self) -> None:
         try:
@@ -38,8 +97,36 @@ class SKManager:
         except Exception as e:
             raise e
         
+    async def _trace_function_invocation(self, context: FunctionInvocationContext, next) -> None:
+        with tracer.span("kernel_function", function=context.function.fully_qualified_name):
+            await next(context)
+        
+    def _find_lights_registry(self):
+        for plugin in self.plugins:
+            if plugin["plugin_name"] == "Lights":
+                return getattr(plugin["plugin"], "registry", None)
+        return None
+        
+    async def start(self) -> None:
+        """Lets plugins do their async setup, such as loading state from a device."""
+        for plugin in self.plugins:
+            start = getattr(plugin["plugin"], "start", None)
+            if start is not None:
+                await start()
+    
+    async def close(self) -> None:
+        """Releases plugin resources such as pooled HTTP clients."""
+        for plugin in self.plugins:
+            close = getattr(plugin["plugin"], "close", None)
+            if close is not None:
+                await close()
+        
     async def make_user_request(self, user_message: str):
-        self.history.add_user_message(user_message)
+        reply = await self._make_local_request(user_message)
+        if reply is not None:
+            return ChatMessageContent(role=AuthorRole.ASSISTANT, content=reply)
+        
+        first_new_message = await self._prepare_llm_request(user_message)
 
         result = await self.chat_completion.get_chat_message_content(
             chat_history=self.history,
@@ -47,9 +134,92 @@ class SKManager:
             kernel=self.kernel
         )
         
-        self.history.add_assistant_message(str(result))
-        
+        await self._finish_llm_request(user_message, first_new_message, str(result), result.metadata if result else {})
         return result
+    
+    async def stream_user_request(self, user_message: str) -> AsyncGenerator[str, None]:
+        """
+        Like make_user_request, but streams the reply and yields it one sentence at a time as the tokens arrive,
+        so speech can start after the first sentence instead of after the whole reply.
+        """
+        reply = await self._make_local_request(user_message)
+        if reply is not None:
+            for sentence in split_sentences(reply):
+                yield sentence
+            return
+        
+        first_new_message = await self._prepare_llm_request(user_message)
+        
+        text = ""
+        buffer = ""
+        metadata = {}
+        async for chunk in self.chat_completion.get_streaming_chat_message_content(
+            chat_history=self.history,
+            settings=self.execution_setting,
+            kernel=self.kernel
+        ):
+            if chunk is None:
+                continue
+            metadata.update(chunk.metadata or {})
+            token = str(chunk)
+            text += token
+            buffer += token
+            
+            *sentences, buffer = split_sentences(buffer, keep_tail=True)
+            for sentence in sentences:
+                yield sentence
+        
+        if buffer.strip():
+            yield buffer.strip()
+        
+        await self._finish_llm_request(user_message, first_new_message, text, metadata)
+    
+    async def _make_local_request(self, user_message: str) -> Optional[str]:
+        """Tries the paths that don't need the model: the fast path router, then the plan cache."""
+        for path, handler in (("fast", self.router and self.router.route), ("cache", self.plan_cache and self._replay_plan)):
+            reply = await handler(user_message) if handler else None
+            if reply is not None:
+                self.history.add_user_message(user_message)
+                self.history.add_assistant_message(reply)
+                self._record_path(path)
+                return reply
+        return None
+    
+    def _record_path(self, path: str) -> None:
+        self.last_request_path = path
+        self.path_counts[path] += 1
+        tracer.current_span().set_attribute("path", path)
+        total = sum(self.path_counts.values())
+        logger.info(
+            "Request served by the %s path (of %d requests: %.0f%% fast path, %.0f%% plan cache)",
+            path, total, 100 * self.path_counts["fast"] / total, 100 * self.path_counts["cache"] / total,
+        )
+        
+    async def _replay_plan(self, user_message: str):
+        return await self.plan_cache.replay(self.kernel, user_message)
+        
+    async def _prepare_llm_request(self, user_message: str) -> int:
+        """Adds the user message and trims the history. Returns the index of the first message the LLM will add."""
+        self.history.add_user_message(user_message)
+        await self.history_manager.compact(self.history)
+        
+        self.last_request_tokens = self.history_manager.count_history_tokens(self.history)
+        logger.info("Sending %d history tokens (estimated) in %d messages", self.last_request_tokens, len(self.history.messages))
+        return len(self.history.messages)
+    
+    async def _finish_llm_request(self, user_message: str, first_new_message: int, reply: str, metadata: dict) -> None:
+        if self.plan_cache:
+            await self.plan_cache.record(
+                self.kernel, user_message, self.history.messages[first_new_message:], reply, self.history.messages[:first_new_message - 1],
+            )
+        
+        self.history.add_assistant_message(reply)
+        self._record_path("llm")
+        
+        # The service's own count also includes the tool definitions and every tool-calling round-trip
+        usage = metadata.get("usage")
+        if usage is not None:
+            logger.info("Prompt tokens reported by the service: %s", usage.prompt_tokens)
                 
     async def start_simple_chat(self, is_logging_on: bool = False) -> None:
         if is_logging_on:
@@ -68,23 +238,18 @@ class SKManager:
             
 if __name__ == "__main__":
     import asyncio
-    lights = [
-        {"id": "a60e6289-7979-4036-b1d5-a3795efba4b3", "name": "bedroom-light-1", "is_on": True, "brightness": 100.0, "color": {"x": 0.3865, "y":0.3784}},
-        {"id": "7ac12c9c-4bc3-4792-83e2-67e93fa9ea6f", "name": "bedroom-light-2", "is_on": True, "brightness": 100.0, "color": {"x": 0.3865, "y":0.3784}},
-        {"id": "4e8a1e19-63a6-49dd-bc8d-4dbb703e1652", "name": "bedroom-light-3", "is_on": True, "brightness": 100.0, "color": {"x": 0.3865, "y":0.3784}}
-    ]
-    groups = [
-        {"id": "bac841b0-3881-4c55-ad41-15b3afa249aa", "name": "Sam's Bedroom", "is_on": True, "brightness": 100.0, "color": {"x": 0.3865, "y":0.3784}}
-    ]
-    
     plugins = [
-        {"plugin": LightsPlugin(lights, groups), "plugin_name": "Lights"},
+        {"plugin": LightsPlugin(), "plugin_name": "Lights"},
         {"plugin": WeatherPlugin(), "plugin_name": "Weather"}
     ]
     
     skm = SKManager(plugins)
     
     async def main():
-        await skm.start_simple_chat()
+        try:
+            await skm.start()
+            await skm.start_simple_chat()
+        finally:
+            await skm.close()
         
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,133 @@
+from typing import Optional
+
+import importlib.util
+import json
+import logging
+import os
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Where benchmarks/stt_models.py saves the model this machine transcribes fast enough with, for STT_MODEL=auto
+STT_MODEL_CHOICE_FILE = os.path.join(os.path.expanduser("~"), ".nl_action_engine", "stt_model.json")
+
+
+class STTBackend:
+    """
+    A speech to text engine. `transcribe` takes 16 kHz float32 mono samples (or a file path) and returns a dict
+    in openai-whisper's shape: {"text": ..., "segments": [{"start": ..., "end": ..., "text": ...}], "language": ...}.
+
+    `language` pins the spoken language (e.g. "en"), which skips language detection on every request.
+    """
+
+    name = "stt"
+
+    def __init__(self, language: Optional[str] = None):
+        self.language = language
+
+    def transcribe(self, audio, **kwargs) -> dict:
+        raise NotImplementedError
+
+
+class WhisperBackend(STTBackend):
+    """openai-whisper on PyTorch, in fp32 on CPU."""
+
+    name = "whisper"
+
+    def __init__(self, model_name: str, threads: Optional[int] = None, language: Optional[str] = None):
+        import whisper
+
+        super().__init__(language)
+        if threads:
+            import torch
+
+            # Process-wide: torch has a single intra-op thread pool
+            torch.set_num_threads(threads)
+        self.whisper = whisper
+        self.model = whisper.load_model(model_name, device="cpu")
+        # Whisper models aren't safe to run from several threads at once
+        self.lock = threading.Lock()
+
+    def transcribe(self, audio, **kwargs) -> dict:
+        if self.language:
+            kwargs.setdefault("language", self.language)
+        with self.lock:
+            return self.whisper.transcribe(self.model, audio, fp16=False, **kwargs)
+
+
+class FasterWhisperBackend(STTBackend):
+    """
+    Whisper on CTranslate2 (`pip install faster-whisper`), with int8-quantized weights by default. On CPU it is
+    several times faster than openai-whisper at the same model size and uses a fraction of the memory.
+    """
+
+    name = "faster-whisper"
+
+    def __init__(
+        self,
+        model_name: str,
+        threads: Optional[int] = None,
+        language: Optional[str] = None,
+        compute_type: str = "int8",
+        beam_size: int = 1,
+    ):
+        from faster_whisper import WhisperModel
+
+        super().__init__(language)
+        # 0 lets CTranslate2 pick the thread count
+        self.model = WhisperModel(model_name, device="cpu", compute_type=compute_type, cpu_threads=threads or 0)
+        # Greedy decoding like openai-whisper's default; faster-whisper otherwise uses a beam of 5
+        self.beam_size = beam_size
+
+    def transcribe(self, audio, **kwargs) -> dict:
+        kwargs.setdefault("beam_size", self.beam_size)
+        if self.language:
+            kwargs.setdefault("language", self.language)
+        if isinstance(audio, np.ndarray):
+            audio = audio.astype(np.float32, copy=False)
+
+        segments, info = self.model.transcribe(audio, **kwargs)
+        # Segments are decoded lazily as the generator is consumed
+        segments = [{"start": segment.start, "end": segment.end, "text": segment.text} for segment in segments]
+        return {"text": "".join(segment["text"] for segment in segments), "segments": segments, "language": info.language}
+
+
+STT_BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+
+def make_stt_backend(backend: str, model_name: str, threads: Optional[int] = None, language: Optional[str] = None, **options) -> STTBackend:
+    """Creates (and loads) a backend by name: "whisper" or "faster-whisper"."""
+    if backend not in STT_BACKENDS:
+        raise ValueError(f"Unknown STT backend '{backend}', expected one of {', '.join(STT_BACKENDS)}")
+    return STT_BACKENDS[backend](model_name, threads=threads, language=language, **options)
+
+
+def default_stt_backend_name() -> str:
+    """STT_BACKEND if set, otherwise faster-whisper when it is installed, since it is the faster one on CPU."""
+    if os.getenv("STT_BACKEND"):
+        return os.getenv("STT_BACKEND")
+    # Only looks for the package: importing it (ctranslate2, av) would cost the startup time lazy loading saves
+    if importlib.util.find_spec("faster_whisper") is None:
+        return WhisperBackend.name
+    return FasterWhisperBackend.name
+
+
+def auto_stt_model(default_model: str, path: str = STT_MODEL_CHOICE_FILE) -> tuple[str, Optional[str]]:
+    """
+    The model benchmarks/stt_models.py picked on this machine and the backend it measured it with. Falls back to
+    `default_model` and no backend when it hasn't been run, or found no model fast enough.
+    """
+    try:
+        with open(path) as file:
+            choice = json.load(file)
+    except (OSError, ValueError):
+        logger.warning("STT_MODEL=auto, but there is no model choice in %s; run benchmarks/stt_models.py. Using %s", path, default_model)
+        return default_model, None
+    if not choice.get("best"):
+        logger.warning("No model was fast enough in %s, using %s", path, default_model)
+        return default_model, None
+    return choice["best"], choice.get("backend")
@@ -0,0 +1,343 @@
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Optional
+from httpx import AsyncBaseTransport, AsyncHTTPTransport, Request, Response
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+import numpy as np
+
+
+class Span:
+    """
+    One timed operation. Used as a context manager it becomes the current span (the parent of spans started
+    inside it, including in awaited coroutines) and ends on exit; otherwise call `end()`.
+    """
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "start_time", "end_time", "attributes", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str], attributes: dict):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_time = time.time_ns()
+        self.end_time = None
+        self.attributes = attributes
+        self._token = None
+
+    @property
+    def duration(self) -> float:
+        """Seconds, so far if the span hasn't ended."""
+        return ((self.end_time or time.time_ns()) - self.start_time) / 1e9
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def end(self) -> None:
+        if self.end_time is None:
+            self.end_time = time.time_ns()
+            self.tracer._on_end(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # An async generator closed from another context; the span is still recorded
+            pass
+        self.end()
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Returned while tracing is disabled, so instrumented code costs one attribute check and a method call."""
+
+    trace_id = None
+    span_id = None
+    duration = 0.0
+
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+class _Timer:
+    __slots__ = ("tracer", "name", "start")
+
+    def __init__(self, tracer: "Tracer", name: str):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.tracer.observe(self.name, time.perf_counter() - self.start)
+
+
+NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Per-utterance timing for the voice loop.
+
+    `span` records an operation with its parent, so one utterance's wake word, recording, transcription, LLM
+    round trips, kernel functions, HTTP calls and TTS share a trace id. Finished spans go to the exporters (a JSONL
+    file and / or OpenTelemetry) and their durations are kept per name for percentile summaries. `timer` only
+    records a duration, for operations that run many times a second such as per-chunk wake word inference.
+
+    Disabled by default, in which case spans and timers are shared no-op objects.
+    """
+
+    def __init__(self, max_samples: int = 10000):
+        self.enabled = False
+        self.exporters = []
+        self.max_samples = max_samples
+        self.durations: dict[str, deque] = defaultdict(lambda: deque(maxlen=self.max_samples))
+        self.lock = threading.Lock()
+
+    def enable(self, jsonl_path: Optional[str] = None, otel: bool = False) -> None:
+        """Starts tracing, writing spans to `jsonl_path` and / or the configured OpenTelemetry tracer provider."""
+        if jsonl_path:
+            self.exporters.append(JSONLExporter(jsonl_path))
+        if otel:
+            self.exporters.append(OTelExporter())
+        self.enabled = True
+
+    def close(self) -> None:
+        self.enabled = False
+        for exporter in self.exporters:
+            exporter.close()
+        self.exporters = []
+
+    # --- Recording ---
+
+    def span(self, name: str, parent: Optional[Span] = None, trace_id: Optional[str] = None, **attributes):
+        """
+        Starts a span under `parent` (default: the current span). Without either, it starts a new trace,
+        or joins `trace_id` when given.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = parent or _current_span.get()
+        if parent is not None and parent is not NOOP_SPAN:
+            span = Span(self, name, parent.trace_id, parent.span_id, attributes)
+        else:
+            span = Span(self, name, trace_id or os.urandom(16).hex(), None, attributes)
+        for exporter in self.exporters:
+            exporter.on_start(span)
+        return span
+
+    def timer(self, name: str):
+        """Times a block into the `name` summary without exporting a span."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return _Timer(self, name)
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self.lock:
+            self.durations[name].append(seconds)
+
+    @contextmanager
+    def use_span(self, span):
+        """Makes `span` the current span without ending it on exit, e.g. to parent work done in another stage."""
+        if span is NOOP_SPAN or not self.enabled:
+            yield span
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+
+    def current_span(self):
+        return _current_span.get() or NOOP_SPAN
+
+    def _on_end(self, span: Span) -> None:
+        self.observe(span.name, span.duration)
+        for exporter in self.exporters:
+            exporter.on_end(span)
+
+    # --- Summaries ---
+
+    def summary(self) -> dict[str, dict]:
+        """Count, mean and p50 / p95 / p99 in milliseconds for every span and timer name."""
+        with self.lock:
+            samples = {name: list(values) for name, values in self.durations.items()}
+        return summarize(samples)
+
+    def format_summary(self) -> str:
+        return format_summary(self.summary())
+
+
+class JSONLExporter:
+    """Appends one JSON object per finished span to a file."""
+
+    def __init__(self, path: str):
+        self.file = open(path, "a", buffering=1)
+        self.lock = threading.Lock()
+
+    def on_start(self, span: Span) -> None:
+        pass
+
+    def on_end(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self.lock:
+            self.file.write(line + "\n")
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class OTelExporter:
+    """
+    Mirrors spans into OpenTelemetry (`pip install opentelemetry-sdk` and configure a tracer provider / exporter),
+    so they can be viewed in Jaeger, Zipkin etc.
+    """
+
+    def __init__(self):
+        from opentelemetry import trace
+
+        self.trace = trace
+        self.otel_tracer = trace.get_tracer("nl-action-engine")
+        self.otel_spans = {}
+
+    def on_start(self, span: Span) -> None:
+        parent = self.otel_spans.get(span.parent_id)
+        context = self.trace.set_span_in_context(parent) if parent is not None else None
+        self.otel_spans[span.span_id] = self.otel_tracer.start_span(span.name, context=context, start_time=span.start_time)
+
+    def on_end(self, span: Span) -> None:
+        otel_span = self.otel_spans.pop(span.span_id, None)
+        if otel_span is not None:
+            for key, value in span.attributes.items():
+                otel_span.set_attribute(key, value if isinstance(value, (str, bool, int, float)) else str(value))
+            otel_span.end(end_time=span.end_time)
+
+    def close(self) -> None:
+        self.otel_spans.clear()
+
+
+# Shared by every module; enabled by main.py when TRACE_FILE or TRACE_OTEL is set
+tracer = Tracer()
+
+
+def run_in_executor(executor, function, *args) -> asyncio.Future:
+    """loop.run_in_executor, but spans started by `function` are parented to the caller's current span."""
+    return asyncio.get_running_loop().run_in_executor(executor, copy_context().run, function, *args)
+
+
+class TracedTransport(AsyncBaseTransport):
+    """
+    An httpx transport that records an "http" span from sending each request until its response headers arrive.
+    Requests that fail (connect errors, timeouts) end their span too, with the error recorded. Wraps `transport`,
+    or an AsyncHTTPTransport made with `transport_options` (verify, limits, ...), which the client then ignores.
+    """
+
+    def __init__(self, transport: Optional[AsyncBaseTransport] = None, **transport_options):
+        self.transport = transport or AsyncHTTPTransport(**transport_options)
+
+    async def handle_async_request(self, request: Request) -> Response:
+        with tracer.span("http", method=request.method, url=str(request.url.copy_with(query=None))) as span:
+            response = await self.transport.handle_async_request(request)
+            span.set_attribute("status_code", response.status_code)
+            return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class TracedChatCompletionMixin:
+    """
+    Mixed into a chat completion service ahead of the service class, records an "llm" span for every round trip
+    to the model, including each one of Semantic Kernel's automatic function calling loop.
+    """
+
+    async def _inner_get_chat_message_contents(self, chat_history, settings):
+        with tracer.span("llm", messages=len(chat_history.messages)):
+            return await super()._inner_get_chat_message_contents(chat_history, settings)
+
+    async def _inner_get_streaming_chat_message_contents(self, chat_history, settings, function_invoke_attempt: int = 0):
+        # Not made current: the generator is suspended between chunks and nothing runs inside it
+        span = tracer.span("llm", messages=len(chat_history.messages), attempt=function_invoke_attempt, stream=True)
+        first = True
+        try:
+            async for messages in super()._inner_get_streaming_chat_message_contents(chat_history, settings, function_invoke_attempt):
+                if first:
+                    span.set_attribute("first_token_ms", round(span.duration * 1000, 3))
+                    first = False
+                yield messages
+        finally:
+            span.end()
+
+
+def summarize(samples: dict[str, list[float]]) -> dict[str, dict]:
+    """Count, mean and p50 / p95 / p99 in milliseconds for lists of durations in seconds."""
+    summary = {}
+    for name, values in sorted(samples.items()):
+        if not values:
+            continue
+        ms = np.asarray(values) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        summary[name] = {"count": len(ms), "mean": float(ms.mean()), "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+    return summary
+
+
+def format_summary(summary: dict[str, dict]) -> str:
+    lines = [f"{'stage':<28}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)"]
+    for name, stats in summary.items():
+        lines.append(f"{name:<28}{stats['count']:>8}{stats['mean']:>10.1f}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}")
+    return "\n".join(lines)
+
+
+def summarize_trace_file(path: str) -> dict[str, dict]:
+    """Percentile summary of a JSONL trace written by JSONLExporter."""
+    samples = defaultdict(list)
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                span = json.loads(line)
+                samples[span["name"]].append(span["duration_ms"] / 1000)
+    return summarize(samples)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a JSONL trace written with TRACE_FILE.")
+    parser.add_argument("trace_file")
+    args = parser.parse_args()
+
+    print(format_summary(summarize_trace_file(args.trace_file)))
@@ -0,0 +1,164 @@
+from typing import Optional
+from collections import OrderedDict
+
+import hashlib
+import os
+import subprocess
+import sys
+import wave
+import numpy as np
+
+
+class TTSBackend:
+    """
+    A text to speech engine.
+
+    Backends that synthesize in-process set `produces_pcm` and implement `synthesize`, and AudioManager plays the
+    returned int16 samples through its own PyAudio instance (and caches them). Backends that play audio themselves
+    implement `speak` instead.
+    """
+
+    produces_pcm = False
+
+    @property
+    def cache_id(self) -> str:
+        """Identifies the voice, so cached audio from one voice is never played for another."""
+        return type(self).__name__
+
+    def synthesize(self, text: str) -> tuple[np.ndarray, int]:
+        """Returns (int16 mono samples, sample rate)."""
+        raise NotImplementedError
+
+    def speak(self, text: str) -> None:
+        raise NotImplementedError
+
+    def stop(self) -> None:
+        """Interrupts speech started by `speak`, if the backend can."""
+
+
+class SayBackend(TTSBackend):
+    """The macOS `say` command. Needs no models, but spawns a process per reply and only exists on macOS."""
+
+    def __init__(self, voice: Optional[str] = None):
+        self.voice = voice
+        self.process: Optional[subprocess.Popen] = None
+
+    def speak(self, text: str) -> None:
+        # Options go before "--", so a reply starting with "-" is spoken rather than parsed as an option
+        self.process = subprocess.Popen(["say"] + (["-v", self.voice] if self.voice else []) + ["--", text])
+        self.process.wait()
+
+    def stop(self) -> None:
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+
+
+class PiperBackend(TTSBackend):
+    """In-process neural TTS with Piper (`pip install piper-tts`), which runs on Linux / CPU-only hosts."""
+
+    produces_pcm = True
+
+    def __init__(self, model_path: str):
+        from piper.voice import PiperVoice
+
+        self.model_path = model_path
+        self.voice = PiperVoice.load(model_path)
+
+    @property
+    def cache_id(self) -> str:
+        return f"piper:{os.path.basename(self.model_path)}"
+
+    def synthesize(self, text: str) -> tuple[np.ndarray, int]:
+        if hasattr(self.voice, "synthesize_stream_raw"):
+            audio = b"".join(self.voice.synthesize_stream_raw(text))
+        else:
+            audio = b"".join(chunk.audio_int16_bytes for chunk in self.voice.synthesize(text))
+        return (np.frombuffer(audio, dtype=np.int16), self.voice.config.sample_rate)
+
+
+class NullBackend(TTSBackend):
+    """Speaks nothing; just records what would have been said. For running the pipeline headless."""
+
+    def __init__(self, echo: bool = False):
+        self.echo = echo
+        self.spoken: list[str] = []
+
+    def speak(self, text: str) -> None:
+        self.spoken.append(text)
+        if self.echo:
+            print(f"[tts] {text}")
+
+
+class FileSinkBackend(TTSBackend):
+    """Writes each reply from a PCM backend to a numbered WAV file instead of playing it."""
+
+    def __init__(self, backend: TTSBackend, directory: str):
+        self.backend = backend
+        self.directory = directory
+        self.files: list[str] = []
+        os.makedirs(directory, exist_ok=True)
+
+    def speak(self, text: str) -> None:
+        samples, rate = self.backend.synthesize(text)
+        path = os.path.join(self.directory, f"reply_{len(self.files):04d}.wav")
+        write_wav(path, samples, rate)
+        self.files.append(path)
+
+
+class PhraseCache:
+    """
+    LRU cache of synthesized audio for short phrases ("Okay.", "The lights are off."), which repeat constantly
+    and are the ones where synthesis time dominates. With a directory, entries also survive restarts.
+    """
+
+    def __init__(self, max_entries: int = 64, max_chars: int = 120, directory: Optional[str] = None):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.directory = directory
+        self.entries: OrderedDict[str, tuple[np.ndarray, int]] = OrderedDict()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get_or_synthesize(self, backend: TTSBackend, text: str) -> tuple[np.ndarray, int]:
+        if len(text) > self.max_chars:
+            return backend.synthesize(text)
+
+        key = hashlib.sha1(f"{backend.cache_id}\n{text}".encode()).hexdigest()
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        path = os.path.join(self.directory, f"{key}.wav") if self.directory else None
+        if path and os.path.exists(path):
+            audio = read_wav(path)
+        else:
+            audio = backend.synthesize(text)
+            if path:
+                write_wav(path, *audio)
+
+        self.entries[key] = audio
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return audio
+
+
+def default_tts_backend() -> TTSBackend:
+    """Piper when PIPER_VOICE_MODEL points at a voice, else `say` on macOS, otherwise a NullBackend that prints replies."""
+    if os.getenv("PIPER_VOICE_MODEL"):
+        return PiperBackend(os.getenv("PIPER_VOICE_MODEL"))
+    if sys.platform == "darwin":
+        return SayBackend()
+    return NullBackend(echo=True)
+
+
+def write_wav(path: str, samples: np.ndarray, rate: int) -> None:
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(samples.astype(np.int16).tobytes())
+
+
+def read_wav(path: str) -> tuple[np.ndarray, int]:
+    with wave.open(path, "rb") as wav_file:
+        return (np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype=np.int16), wav_file.getframerate())
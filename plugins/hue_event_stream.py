@@ -0,0 +1,113 @@
+from typing import Awaitable, Callable, Optional
+from httpx import AsyncClient, HTTPError, Timeout
+
+import asyncio
+import json
+import logging
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plugins.hue_registry import HueRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class HueEventStream:
+    """
+    Background subscriber to the bridge's server-sent event stream (/eventstream/clip/v2).
+
+    State changes made anywhere (wall switches, the Hue app, other automations) arrive as `update` events and are
+    applied to the registry in place, so reads can be answered from memory. Lights being added or removed, and
+    reconnecting after a dropped stream (events may have been missed), trigger a full resync instead.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        headers: dict,
+        registry: HueRegistry,
+        resync: Callable[[], Awaitable[None]],
+        verify: bool = False,
+        retry_seconds: float = 1.0,
+        max_retry_seconds: float = 30.0,
+    ):
+        self.url = url
+        self.registry = registry
+        self.resync = resync
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        # The bridge keeps the stream open indefinitely, so there is no read timeout
+        self.client = AsyncClient(headers={**headers, "Accept": "text/event-stream"}, verify=verify, timeout=Timeout(10.0, read=None))
+        self.task: Optional[asyncio.Task] = None
+        self.connected = asyncio.Event()
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.client.aclose()
+
+    async def _run(self) -> None:
+        delay = self.retry_seconds
+        connected_before = False
+
+        while True:
+            try:
+                async with self.client.stream("GET", self.url) as response:
+                    response.raise_for_status()
+                    self.connected.set()
+                    delay = self.retry_seconds
+                    if connected_before:
+                        await self.resync()
+                    connected_before = True
+
+                    data_lines = []
+                    async for line in response.aiter_lines():
+                        if line.startswith("data:"):
+                            data_lines.append(line[5:].strip())
+                        elif line == "" and data_lines:
+                            await self._handle_message("\n".join(data_lines))
+                            data_lines = []
+            except (HTTPError, KeyError, ValueError) as e:
+                # Includes a resync after reconnecting that got an unexpected response
+                logger.warning("Hue event stream error: %s", e)
+            except Exception:
+                # Anything else would end the task silently and leave the registry going stale
+                logger.exception("Hue event stream failed, reconnecting")
+
+            self.connected.clear()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_retry_seconds)
+
+    async def _handle_message(self, data: str) -> None:
+        try:
+            events = json.loads(data)
+        except ValueError:
+            logger.warning("Ignoring malformed Hue event: %r", data)
+            return
+
+        needs_resync = False
+        for event in events if isinstance(events, list) else []:
+            try:
+                if event.get("type") == "update":
+                    for resource in event.get("data", []):
+                        self.registry.apply_update(resource)
+                elif event.get("type") in ("add", "delete"):
+                    needs_resync = True
+            except (AttributeError, KeyError, TypeError, ValueError):
+                logger.warning("Ignoring malformed Hue event: %r", event)
+
+        if needs_resync:
+            try:
+                await self.resync()
+            except (HTTPError, KeyError, ValueError) as e:
+                logger.warning("Hue resync failed: %s", e)
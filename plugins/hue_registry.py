@@ -0,0 +1,158 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+@dataclass(slots=True)
+class LightRecord:
+    id: str
+    name: str
+    is_on: bool = False
+    # None until the bridge reports it: lights without dimming, and grouped_lights, which never report color
+    brightness: Optional[float] = None
+    color: Optional[dict] = None
+    room: Optional[str] = None
+
+    def to_model(self) -> dict:
+        return {"id": self.id, "name": self.name, "is_on": self.is_on, "brightness": self.brightness, "color": self.color}
+
+
+@dataclass(slots=True)
+class GroupRecord:
+    id: str
+    name: str
+    is_on: bool = False
+    # None until the bridge reports it: lights without dimming, and grouped_lights, which never report color
+    brightness: Optional[float] = None
+    color: Optional[dict] = None
+    light_ids: list[str] = field(default_factory=list)
+
+    def to_model(self) -> dict:
+        return {"id": self.id, "name": self.name, "is_on": self.is_on, "brightness": self.brightness, "color": self.color}
+
+
+class HueRegistry:
+    """
+    Indexed view of the bridge's lights and groups (rooms / zones).
+
+    Lights and groups are looked up by Id or by (case-insensitive) name in O(1), and each group knows its lights.
+    The registry is normally filled from the bridge's /clip/v2/resource listing with `load_resources`.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        self.lights: dict[str, LightRecord] = {}
+        self.groups: dict[str, GroupRecord] = {}
+        self._light_ids_by_name: dict[str, str] = {}
+        self._group_ids_by_name: dict[str, str] = {}
+
+    @classmethod
+    def from_models(cls, lights: list[dict], groups: list[dict]) -> "HueRegistry":
+        """Builds a registry from hand-written LightModel / GroupModel dicts."""
+        registry = cls()
+        for light in lights:
+            registry.add_light(LightRecord(light["id"], light["name"], light["is_on"], light.get("brightness"), light.get("color")))
+        for group in groups:
+            registry.add_group(GroupRecord(group["id"], group["name"], group["is_on"], group.get("brightness"), group.get("color")))
+        return registry
+
+    def add_light(self, light: LightRecord) -> None:
+        self.lights[light.id] = light
+        self._light_ids_by_name[light.name.lower()] = light.id
+
+    def add_group(self, group: GroupRecord) -> None:
+        self.groups[group.id] = group
+        self._group_ids_by_name[group.name.lower()] = group.id
+
+    def get_light(self, id_or_name: str) -> Optional[LightRecord]:
+        return self.lights.get(id_or_name) or self.lights.get(self._light_ids_by_name.get(id_or_name.lower(), ""))
+
+    def get_group(self, id_or_name: str) -> Optional[GroupRecord]:
+        return self.groups.get(id_or_name) or self.groups.get(self._group_ids_by_name.get(id_or_name.lower(), ""))
+
+    def lights_in_group(self, id_or_name: str) -> list[LightRecord]:
+        group = self.get_group(id_or_name)
+        if group is None:
+            return []
+        return [self.lights[light_id] for light_id in group.light_ids if light_id in self.lights]
+
+    def apply_update(self, resource: dict) -> None:
+        """Applies one `data` item of an event stream `update` event. Unknown resources are ignored."""
+        if resource.get("type") == "light":
+            record = self.lights.get(resource["id"])
+        elif resource.get("type") == "grouped_light":
+            record = self.groups.get(resource["id"])
+        else:
+            return
+        if record is None:
+            return
+
+        apply_state(record, resource)
+        if "metadata" in resource and "name" in resource["metadata"] and isinstance(record, LightRecord):
+            self._light_ids_by_name.pop(record.name.lower(), None)
+            record.name = resource["metadata"]["name"]
+            self._light_ids_by_name[record.name.lower()] = record.id
+
+    def load_resources(self, resources: list[dict]) -> None:
+        """
+        Replaces the registry contents with the `data` list of a GET /clip/v2/resource response.
+
+        Lights come from `light` resources. Each `grouped_light` becomes a group named after the room or zone
+        that owns it; rooms list devices (which own lights) and zones list lights directly.
+        """
+        by_type: dict[str, list[dict]] = {}
+        for resource in resources:
+            by_type.setdefault(resource.get("type"), []).append(resource)
+
+        old_lights = self.lights
+        self.clear()
+
+        lights_by_device: dict[str, list[str]] = {}
+        for resource in by_type.get("light", []):
+            light = LightRecord(resource["id"], resource.get("metadata", {}).get("name", resource["id"]))
+            # Lights that don't report a color keep the last one we knew about
+            if resource["id"] in old_lights:
+                light.color = old_lights[resource["id"]].color
+            apply_state(light, resource)
+            self.add_light(light)
+            lights_by_device.setdefault(resource.get("owner", {}).get("rid"), []).append(light.id)
+
+        group_owners: dict[str, tuple[str, list[str]]] = {}
+        for resource in by_type.get("room", []):
+            light_ids = [light_id for child in resource.get("children", []) for light_id in lights_by_device.get(child["rid"], [])]
+            group_owners[resource["id"]] = (resource["metadata"]["name"], light_ids)
+            for light_id in light_ids:
+                self.lights[light_id].room = resource["metadata"]["name"]
+        for resource in by_type.get("zone", []):
+            light_ids = [child["rid"] for child in resource.get("children", []) if child.get("rtype") == "light"]
+            group_owners[resource["id"]] = (resource["metadata"]["name"], light_ids)
+
+        for resource in by_type.get("grouped_light", []):
+            owner = group_owners.get(resource.get("owner", {}).get("rid"))
+            # The bridge's "all lights" group has no room or zone
+            name, light_ids = owner if owner else ("All lights", list(self.lights))
+            group = GroupRecord(resource["id"], name, light_ids=light_ids)
+            apply_state(group, resource)
+            self.add_group(group)
+
+
+def state_payload(state: dict) -> dict:
+    """The Hue v2 PUT body for the LightModel / GroupModel fields in `state`, skipping absent or unknown (None) ones."""
+    payload = {}
+    if state.get("is_on") is not None:
+        payload["on"] = {"on": state["is_on"]}
+    if state.get("brightness") is not None:
+        payload["dimming"] = {"brightness": state["brightness"]}
+    if state.get("color") is not None:
+        payload["color"] = {"xy": state["color"]}
+    return payload
+
+
+def apply_state(record: LightRecord | GroupRecord, resource: dict) -> None:
+    """Copies the on / dimming / color fields of a Hue v2 resource (or event) onto a record."""
+    if "on" in resource:
+        record.is_on = resource["on"]["on"]
+    if "dimming" in resource:
+        record.brightness = resource["dimming"]["brightness"]
+    if "color" in resource and "xy" in resource["color"]:
+        record.color = dict(resource["color"]["xy"])
@@ -0,0 +1,280 @@
+from typing import TypedDict, Annotated, List, Optional
+from semantic_kernel.functions import kernel_function
+from httpx import AsyncClient, HTTPError, Limits, Timeout
+
+import asyncio
+import fnmatch
+import logging
+import os
+import sys
+from dotenv import load_dotenv
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plugins.hue_registry import HueRegistry, LightRecord, GroupRecord, apply_state, state_payload
+from plugins.hue_event_stream import HueEventStream
+from managers.tracing import TracedTransport
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# brightness and color are None where the bridge hasn't reported them
+class LightModel(TypedDict):
+    id: str
+    name: str
+    is_on: bool
+    brightness: Optional[float]
+    color: Optional[dict[str, float]]
+    
+class GroupModel(TypedDict):
+    id: str
+    name: str
+    is_on: bool
+    brightness: Optional[float]
+    color: Optional[dict[str, float]]
+    
+class LightChangeResult(TypedDict):
+    id: str
+    name: str
+    ok: bool
+    error: Optional[str]
+
+class CommandPacer:
+    """Spaces commands at least 1 / `rate` seconds apart, in the order they ask for a slot."""
+    
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self.next_slot = 0.0
+        
+    async def wait(self) -> None:
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class LightsPlugin:
+    # Constants
+    BRIDGE_IP = os.getenv("PHILLIPS_HUE_BRIDGE_IP")
+    APP_KEY = os.getenv("PHILLIPS_HUE_APP_KEY")
+    BRIDGE_URL = f"https://{BRIDGE_IP}"
+    BASE_URL = f"{BRIDGE_URL}/clip/v2/resource"
+    EVENT_STREAM_PATH = "/eventstream/clip/v2"
+    HEADERS = {
+        "hue-application-key": APP_KEY or ""
+    }
+    
+    def __init__(
+        self,
+        lights: Optional[list[LightModel]] = None,
+        groups: Optional[list[GroupModel]] = None,
+        max_connections: int = 4,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 5.0,
+        max_concurrent_requests: int = 3,
+        max_commands_per_second: float = 10.0,
+        subscribe_events: bool = False,
+        bridge_url: Optional[str] = None,
+        sync_retry_seconds: float = 5.0,
+        max_sync_retry_seconds: float = 60.0,
+    ):
+        # Lights and groups indexed by Id / name. Filled by sync() from the bridge, or seeded from the given lists
+        self.registry = HueRegistry.from_models(lights or [], groups or [])
+        
+        # One long-lived client, so light changes reuse a kept-alive TLS connection to the bridge
+        # instead of handshaking on every request. The bridge throttles connections, so keep the pool small.
+        bridge_url = bridge_url or LightsPlugin.BRIDGE_URL
+        self.client = AsyncClient(
+            base_url=f"{bridge_url}/clip/v2/resource",
+            headers=LightsPlugin.HEADERS,
+            transport=TracedTransport(
+                verify=False,
+                limits=Limits(max_connections=max_connections, max_keepalive_connections=max_connections, keepalive_expiry=keepalive_expiry),
+            ),
+            timeout=Timeout(timeout),
+        )
+        # Bounds how many PUTs are in flight at once; the bridge only handles a few connections
+        self.bridge_semaphore = asyncio.Semaphore(max_concurrent_requests)
+        # And how often they are sent: the bridge drops light commands beyond roughly 10 per second
+        self.command_pacer = CommandPacer(max_commands_per_second)
+        
+        # Optionally keep the registry fresh from the bridge's event stream, so reads never need a round-trip
+        self.event_stream = HueEventStream(
+            f"{bridge_url}{LightsPlugin.EVENT_STREAM_PATH}",
+            LightsPlugin.HEADERS,
+            self.registry,
+            self.sync,
+        ) if subscribe_events else None
+        
+        # Retries the initial sync in the background when the bridge can't be reached at startup
+        self.sync_retry_seconds = sync_retry_seconds
+        self.max_sync_retry_seconds = max_sync_retry_seconds
+        self.sync_task: Optional[asyncio.Task] = None
+        
+    async def start(self) -> None:
+        try:
+            await self.sync()
+        except (HTTPError, KeyError, ValueError) as e:
+            # Don't take weather and voice down with the bridge: start without lights and keep trying
+            logger.warning("Couldn't load lights from the Hue bridge, retrying in the background: %s", e)
+            self.sync_task = asyncio.create_task(self._retry_sync())
+        if self.event_stream:
+            self.event_stream.start()
+        
+    async def close(self) -> None:
+        if self.sync_task:
+            self.sync_task.cancel()
+            try:
+                await self.sync_task
+            except asyncio.CancelledError:
+                pass
+            self.sync_task = None
+        if self.event_stream:
+            await self.event_stream.stop()
+        await self.client.aclose()
+        
+    async def _retry_sync(self) -> None:
+        delay = self.sync_retry_seconds
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.sync()
+            except (HTTPError, KeyError, ValueError) as e:
+                logger.warning("Hue bridge sync failed: %s", e)
+                delay = min(delay * 2, self.max_sync_retry_seconds)
+            else:
+                logger.info("Loaded %d lights from the Hue bridge", len(self.registry.lights))
+                self.sync_task = None
+                return
+        
+    async def sync(self) -> None:
+        """Reloads every light, room and zone from the bridge's resource listing."""
+        response = await self.client.get("")
+        response.raise_for_status()
+        self.registry.load_resources(response.json()["data"])
+    
+    # --- Kernel Functions ---
+    
+    @kernel_function
+    async def get_lights(self) -> List[LightModel]:
+        """Gets a list of lights and their current state."""
+        return [light.to_model() for light in self.registry.lights.values()]
+    
+    @kernel_function
+    async def get_groups(self) -> List[GroupModel]:
+        """Gets a list of groups (rooms and zones) and their current state."""
+        return [group.to_model() for group in self.registry.groups.values()]
+    
+    @kernel_function
+    async def get_light_state(self, id: Annotated[str, "The Id or name of the light"]) -> Optional[LightModel]:
+        """Gets the state of a particular light."""
+        light = self.registry.get_light(id)
+        return light.to_model() if light else None
+    
+    @kernel_function
+    async def get_group_lights(self, id: Annotated[str, "The Id or name of the group or room"]) -> List[LightModel]:
+        """Gets the lights that belong to a group or room and their current state."""
+        return [light.to_model() for light in self.registry.lights_in_group(id)]
+    
+    @kernel_function
+    async def change_light_state(self, id: Annotated[str, "The Id of the light"], new_light_state: LightModel) -> Optional[LightModel | HTTPError]:
+        """Changes the state of an individual light. Use x and y values to change color. Leave out fields that should stay as they are."""
+        light = self.registry.get_light(id)
+        if light is None:
+            return None
+        
+        return await self._change_light(light, new_light_state)
+    
+    @kernel_function
+    async def change_lights_state(
+        self,
+        new_light_state: LightModel,
+        # `list[X] | None` rather than Optional[List[X]] or List[X] | None: Semantic Kernel can only parse arguments
+        # into a builtin union, and treats a parameter without one as required
+        ids: Annotated[list[str] | None, "The Ids of the lights to change"] = None,
+        name_pattern: Annotated[str | None, "A wildcard pattern matching the names of the lights to change, e.g. 'bedroom-light-*'"] = None,
+    ) -> List[LightChangeResult]:
+        """Changes the state of several lights at once, selected by Id and/or name pattern. Use x and y values to change color."""
+        targets = {light.id: light for light in map(self.registry.get_light, ids or []) if light}
+        if name_pattern:
+            pattern = name_pattern.lower()
+            targets.update((light.id, light) for light in self.registry.lights.values() if fnmatch.fnmatch(light.name.lower(), pattern))
+        
+        results = await asyncio.gather(*(self.change_light_state(light_id, new_light_state) for light_id in targets))
+        
+        changes = []
+        for light, result in zip(targets.values(), results):
+            # None when the light was removed between being selected and being changed
+            error = "light not found" if result is None else str(result) if isinstance(result, HTTPError) else None
+            changes.append(LightChangeResult(id=light.id, name=light.name, ok=error is None, error=error))
+        return changes
+    
+    @kernel_function
+    async def change_group_state(self, id: Annotated[str, "The Id of the group"], new_group_state: GroupModel) -> Optional[GroupModel | HTTPError]:
+        """Changes the state of an individual light. Use x and y values to change color. Leave out fields that should stay as they are."""
+        group = self.registry.get_group(id)
+        if group is None:
+            return None
+        
+        return await self._change_group(group, new_group_state)
+    
+    
+    # --- Helper Functions ---
+    
+    async def _change_light(self, light: LightRecord, new_state: dict) -> (LightModel | HTTPError):
+        """Actually changes the light's state using the Phillips Hue API."""
+        url = f"/light/{light.id}"
+        # Only the fields the caller set, so turning a room off doesn't also reset its brightness and color
+        payload = state_payload(new_state)
+        try:
+            async with self.bridge_semaphore:
+                await self.command_pacer.wait()
+                response = await self.client.put(url, json=payload)
+            
+            response.raise_for_status()
+            apply_state(light, payload)
+            return light.to_model()
+        except HTTPError as e:
+            return e
+
+
+    async def _change_group(self, group: GroupRecord, new_state: dict) -> (GroupModel | HTTPError):
+        """Actually changes the group's state using the Phillips Hue API."""
+        url = f"/grouped_light/{group.id}"
+        payload = state_payload(new_state)
+        try:
+            async with self.bridge_semaphore:
+                await self.command_pacer.wait()
+                response = await self.client.put(url, json=payload)
+
+            response.raise_for_status()
+            apply_state(group, payload)
+            return group.to_model()
+        except HTTPError as e:
+            return e
+        
+        
+if __name__ == "__main__":
+    import asyncio
+    lights = [
+        {"id": "a60e6289-7979-4036-b1d5-a3795efba4b3", "name": "bedroom-light-1", "is_on": True, "brightness": 100.0, "color": {"x": 0.3865, "y":0.3784}},
+        {"id": "7ac12c9c-4bc3-4792-83e2-67e93fa9ea6f", "name": "bedroom-light-2", "is_on": True, "brightness": 100.0, "color": {"x": 0.3865, "y":0.3784}},
+        {"id": "4e8a1e19-63a6-49dd-bc8d-4dbb703e1652", "name": "bedroom-light-3", "is_on": True, "brightness": 100.0, "color": {"x": 0.3865, "y":0.3784}}
+    ]
+    new_light = {"id": "a60e6289-7979-4036-b1d5-a3795efba4b3", "name": "bedroom-light-1", "is_on": True, "brightness": 100.0, "color": {"x": 0.3865, "y":0.3784}}
+    
+    groups = [
+        {"id": "bac841b0-3881-4c55-ad41-15b3afa249aa", "name": "Sam's Bedroom", "is_on": True, "brightness": 100.0, "color": {"x": 0.3865, "y":0.3784}}
+    ]
+    new_group = {"id": "bac841b0-3881-4c55-ad41-15b3afa249aa", "name": "Sam's Bedroom", "is_on": True, "brightness": 100.0, "color": {"x": 0.3865, "y":0.3784}}
+    
+    
+    
+    lp = LightsPlugin(lights, groups)
+    
+    async def main():
+        #print(await lp.change_light_state("a60e6289-7979-4036-b1d5-a3795efba4b3", new_light))
+        print(await lp.change_group_state("bac841b0-3881-4c55-ad41-15b3afa249aa", new_group))
+        await lp.close()
+        
+    asyncio.run(main())
\ No newline at end of file
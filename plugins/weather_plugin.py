@@ -0,0 +1,137 @@
+from typing import TypedDict, Annotated, List, Optional
+from semantic_kernel.functions import kernel_function
+from httpx import AsyncClient, Limits, Timeout
+from datetime import datetime, timezone, timedelta
+from collections import OrderedDict
+
+import asyncio
+import os
+import sys
+import time
+from dotenv import load_dotenv
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.tracing import TracedTransport
+
+load_dotenv()
+
+class WeatherDesc(TypedDict):
+    name: str
+    desc: str
+    low: int
+    high: int
+    current_temp: int
+    feels_like: int
+    
+
+class WeatherPlugin:
+    BASE = "https://api.openweathermap.org/data/2.5"
+    API_KEY = os.getenv("OPEN_WEATHER_MAP_API_KEY")
+    
+    def __init__(self, ttl_seconds: float = 600.0, max_cached_cities: int = 32, timeout: float = 5.0, max_connections: int = 4, base_url: Optional[str] = None):
+        # base_url points the plugin at a stand-in API, e.g. fakes.weather_api.FakeWeatherAPI in benchmarks
+        base_url = base_url or WeatherPlugin.BASE
+        self.current_weather_endpoint = f"{base_url}/weather?"
+        self.forecast_endpoint = f"{base_url}/forecast?"
+        
+        # Weather changes on the order of minutes, so answers are cached per city for ttl_seconds
+        self.ttl_seconds = ttl_seconds
+        self.max_cached_cities = max_cached_cities
+        self.cache: OrderedDict[str, tuple[float, WeatherDesc]] = OrderedDict()
+        # Fetches currently running, so concurrent requests for the same city share one
+        self.in_flight: dict[str, asyncio.Task] = {}
+        
+        self.client = AsyncClient(
+            transport=TracedTransport(limits=Limits(max_connections=max_connections, max_keepalive_connections=max_connections)),
+            timeout=Timeout(timeout),
+        )
+        
+    async def close(self) -> None:
+        await self.client.aclose()
+    
+    async def get_low_and_high(self, city: str) -> (tuple[int, int] | tuple[None, None]):
+        response = await self.client.get(self.forecast_endpoint + f"q={city}&appid={WeatherPlugin.API_KEY}&units=imperial")
+        response.raise_for_status()
+        data = response.json()
+        
+        tz_offset = data["city"]["timezone"]
+        local_tz = timezone(timedelta(seconds=tz_offset))
+        
+        now_local = datetime.now(local_tz)            
+        today = now_local.strftime("%Y-%m-%d")
+        
+        today_temps = []
+        for entry in data["list"]:
+            utc_time = datetime.strptime(entry["dt_txt"], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+            local_time = utc_time.astimezone(local_tz)
+            
+            if local_time.strftime("%Y-%m-%d") == today:
+                today_temps.append(entry["main"]["temp"])
+                
+        if not today_temps:
+            return (None, None)
+                
+        return (int(min(today_temps)), int(max(today_temps)))
+    
+    @kernel_function
+    async def get_weather_info(self, city: Annotated[str, "The city to get the weather data from"]) -> Optional[WeatherDesc]:
+        key = " ".join(city.lower().split())
+        
+        cached = self.cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            self.cache.move_to_end(key)
+            return cached[1]
+        
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_and_cache(key, city))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        
+        # Shielded so one caller being cancelled doesn't cancel the fetch the others are waiting on
+        return await asyncio.shield(task)
+    
+    async def _fetch_and_cache(self, key: str, city: str) -> WeatherDesc:
+        # Only the fetching task writes the entry, however many callers are waiting on it
+        weather_desc = await self._fetch_weather_info(city)
+        
+        self.cache[key] = (time.monotonic() + self.ttl_seconds, weather_desc)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_cached_cities:
+            self.cache.popitem(last=False)
+        
+        return weather_desc
+    
+    async def _fetch_weather_info(self, city: str) -> WeatherDesc:
+        # The current weather and the forecast are independent, so fetch them at the same time
+        response, (low, high) = await asyncio.gather(
+            self.client.get(self.current_weather_endpoint + f"q={city}&appid={WeatherPlugin.API_KEY}&units=imperial"),
+            self.get_low_and_high(city),
+        )
+        # Raised as HTTPStatusError, so the function guard can tell an outage (5xx) from an unknown city (404)
+        response.raise_for_status()
+        data = response.json()
+            
+        weather_desc = WeatherDesc(
+            name=data['name'],
+            desc=data['weather'][0]['description'],
+            low=low,
+            high=high,
+            current_temp=int(data['main']['temp']),
+            feels_like=int(data['main']['feels_like']),
+        )
+        
+        return weather_desc
+        
+    
+    
+if __name__ == "__main__":
+    import asyncio
+    
+    wp = WeatherPlugin()
+    
+    async def main():
+        print(await wp.get_weather_info("New York"))
+        await wp.close()
+        
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,184 @@
+import asyncio
+import time
+
+import httpx
+from semantic_kernel.functions import KernelArguments, kernel_function
+
+from fakes.chat_service import ScriptedChatCompletion
+from managers.function_guard import GUARD_METADATA_KEY
+from managers.sk_manager import SKManager
+from plugins.phillips_hue_lights_plugin import LightsPlugin
+
+
+class SlowPlugin:
+    def __init__(self):
+        self.delay = 10.0
+        self.calls = 0
+
+    @kernel_function
+    async def hang(self, city: str) -> dict:
+        """Takes `delay` seconds."""
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"city": city}
+
+    @kernel_function
+    async def quick(self, city: str) -> dict:
+        """Takes a moment."""
+        await asyncio.sleep(0.2)
+        return {"city": city}
+
+
+SCRIPT = [{
+    "match": "go",
+    "calls": [
+        {"function": "Slow-hang", "arguments": {"city": "a"}},
+        {"function": "Slow-quick", "arguments": {"city": "b"}},
+        {"function": "Slow-quick", "arguments": {"city": "c"}},
+    ],
+    "reply": "Done.",
+}]
+
+
+def make_manager(plugin) -> SKManager:
+    return SKManager(
+        [{"plugin": plugin, "plugin_name": "Slow"}],
+        fast_path=False,
+        cache_plans=False,
+        chat_completion=ScriptedChatCompletion(SCRIPT),
+        function_timeout=0.3,
+        function_timeouts={"Slow-quick": 1.0},
+    )
+
+
+async def invoke_hang(sk_manager: SKManager):
+    return await sk_manager.kernel.invoke(plugin_name="Slow", function_name="hang", arguments=KernelArguments(city="a"))
+
+
+def test_tool_calls_run_concurrently_and_a_hung_one_times_out():
+    async def run():
+        sk_manager = make_manager(SlowPlugin())
+        started = time.perf_counter()
+        assert str(await sk_manager.make_user_request("go")) == "Done."
+        elapsed = time.perf_counter() - started
+
+        results = {item.id: item for message in sk_manager.history.messages for item in message.items if hasattr(item, "result")}
+        hang = next(result for result in results.values() if result.function_name == "hang")
+        assert hang.result["error"] == "timeout"
+        assert hang.result["timeout_seconds"] == 0.3
+        assert hang.metadata[GUARD_METADATA_KEY] == "timeout"
+        assert sorted(result.result["city"] for result in results.values() if result.function_name == "quick") == ["b", "c"]
+        # Bounded by the slowest call's deadline rather than the sum of the calls
+        assert elapsed < 0.6
+
+    asyncio.run(run())
+
+
+def test_breaker_opens_after_repeated_failures_and_recovers():
+    async def run():
+        plugin = SlowPlugin()
+        sk_manager = make_manager(plugin)
+        sk_manager.function_guard.reset_seconds = 0.2
+
+        for _ in range(sk_manager.function_guard.failure_threshold):
+            assert (await invoke_hang(sk_manager)).value["error"] == "timeout"
+        # Open: fails straight away without calling the function
+        calls = plugin.calls
+        result = await invoke_hang(sk_manager)
+        assert result.value["error"] == "unavailable"
+        assert plugin.calls == calls
+
+        # After reset_seconds one trial call goes through and closes the circuit
+        await asyncio.sleep(0.25)
+        plugin.delay = 0.0
+        assert (await invoke_hang(sk_manager)).value == {"city": "a"}
+        assert sk_manager.function_guard.breakers["Slow-hang"].opened_at is None
+
+    asyncio.run(run())
+
+
+def test_returned_http_errors_count_as_failures():
+    async def run():
+        # Nothing listens on the discard port, so every request fails to connect
+        lights = LightsPlugin(
+            lights=[{"id": "l1", "name": "lamp", "is_on": True, "brightness": 50.0, "color": None}],
+            bridge_url="http://127.0.0.1:9",
+            timeout=0.5,
+        )
+        sk_manager = SKManager([{"plugin": lights, "plugin_name": "Lights"}], fast_path=False, chat_completion=ScriptedChatCompletion([]))
+        try:
+            for _ in range(sk_manager.function_guard.failure_threshold):
+                await sk_manager.kernel.invoke(
+                    plugin_name="Lights", function_name="change_light_state", arguments=KernelArguments(id="l1", new_light_state={"is_on": False})
+                )
+            breaker = sk_manager.function_guard.breakers["Lights-change_light_state"]
+            assert breaker.opened_at is not None
+        finally:
+            await lights.close()
+
+    asyncio.run(run())
+
+
+class FlakyPlugin:
+    def __init__(self):
+        self.error: Exception = KeyError("city")
+        self.delay = 0.0
+
+    @kernel_function
+    async def lookup(self, city: str) -> dict:
+        """Raises `error` after `delay` seconds."""
+        await asyncio.sleep(self.delay)
+        raise self.error
+
+
+def http_status_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "http://weather.test/weather")
+    return httpx.HTTPStatusError("failed", request=request, response=httpx.Response(status_code, request=request))
+
+
+async def invoke_lookup(sk_manager: SKManager):
+    try:
+        await sk_manager.kernel.invoke(plugin_name="Slow", function_name="lookup", arguments=KernelArguments(city="atlantis"))
+    except Exception:
+        pass
+
+
+def test_bad_requests_dont_open_the_breaker():
+    async def run():
+        plugin = FlakyPlugin()
+        sk_manager = make_manager(plugin)
+        breaker = sk_manager.function_guard.breaker_for("Slow-lookup")
+
+        for error in [KeyError("city"), ValueError("bad json"), http_status_error(404)] * sk_manager.function_guard.failure_threshold:
+            plugin.error = error
+            await invoke_lookup(sk_manager)
+        assert breaker.failures == 0 and breaker.opened_at is None
+
+        plugin.error = http_status_error(503)
+        for _ in range(sk_manager.function_guard.failure_threshold):
+            await invoke_lookup(sk_manager)
+        assert breaker.opened_at is not None
+
+    asyncio.run(run())
+
+
+def test_cancelled_trial_call_lets_the_next_one_through():
+    async def run():
+        plugin = FlakyPlugin()
+        plugin.error = httpx.ConnectError("refused")
+        sk_manager = make_manager(plugin)
+        sk_manager.function_guard.reset_seconds = 0.0
+        for _ in range(sk_manager.function_guard.failure_threshold):
+            await invoke_lookup(sk_manager)
+        breaker = sk_manager.function_guard.breakers["Slow-lookup"]
+        assert breaker.opened_at is not None
+
+        plugin.delay = 0.2
+        trial = asyncio.create_task(invoke_lookup(sk_manager))
+        await asyncio.sleep(0.05)
+        assert breaker.trial_running
+        trial.cancel()
+        await asyncio.gather(trial, return_exceptions=True)
+        assert not breaker.trial_running and breaker.allow()
+
+    asyncio.run(run())
@@ -0,0 +1,75 @@
+import asyncio
+
+from semantic_kernel.contents import ChatHistory, ChatMessageContent, FunctionCallContent, FunctionResultContent, AuthorRole
+
+from fakes.chat_service import ScriptedChatCompletion
+from managers.history_manager import HistoryManager
+
+
+def add_turn(history: ChatHistory, n: int, tool_calls: int = 1) -> None:
+    history.add_user_message(f"request {n} " + "padding " * 20)
+    calls = [FunctionCallContent(id=f"call_{n}_{i}", name="Lights-get_lights", arguments="{}") for i in range(tool_calls)]
+    history.add_message(ChatMessageContent(role=AuthorRole.ASSISTANT, items=calls))
+    for call in calls:
+        history.add_message(ChatMessageContent(
+            role=AuthorRole.TOOL,
+            items=[FunctionResultContent(id=call.id, function_name="get_lights", plugin_name="Lights", result="[] " * 30)],
+        ))
+    history.add_assistant_message(f"reply {n}")
+
+
+def call_ids(history: ChatHistory) -> tuple[set, set]:
+    calls, results = set(), set()
+    for message in history.messages:
+        for item in message.items:
+            if isinstance(item, FunctionCallContent):
+                calls.add(item.id)
+            elif isinstance(item, FunctionResultContent):
+                results.add(item.id)
+    return calls, results
+
+
+def test_trimming_keeps_tool_calls_with_their_results():
+    history = ChatHistory()
+    history.add_system_message("You are a home assistant.")
+    for n in range(10):
+        add_turn(history, n, tool_calls=2)
+    manager = HistoryManager(max_tokens=250)
+    assert manager.count_history_tokens(history) > 250
+
+    asyncio.run(manager.compact(history))
+
+    assert manager.count_history_tokens(history) <= 250
+    assert history.messages[0].role == AuthorRole.SYSTEM
+    assert history.messages[1].role == AuthorRole.USER
+    calls, results = call_ids(history)
+    assert calls == results
+    assert "call_9_0" in calls
+
+
+def test_latest_turn_is_kept_even_over_budget():
+    history = ChatHistory()
+    add_turn(history, 0)
+    add_turn(history, 1, tool_calls=5)
+
+    asyncio.run(HistoryManager(max_tokens=10).compact(history))
+
+    assert history.messages[0].content.startswith("request 1")
+    calls, results = call_ids(history)
+    assert calls == results == {f"call_1_{i}" for i in range(5)}
+
+
+def test_dropped_turns_are_summarized():
+    history = ChatHistory()
+    for n in range(6):
+        add_turn(history, n)
+    service = ScriptedChatCompletion([], fallback_reply="The user asked about the lights.")
+    manager = HistoryManager(max_tokens=300, summary_service=service, summary_tokens=50)
+
+    asyncio.run(manager.compact(history))
+
+    summary = history.messages[0]
+    assert summary.metadata.get(HistoryManager.SUMMARY_KEY)
+    assert "The user asked about the lights." in summary.content
+    assert history.messages[1].role == AuthorRole.USER
+    assert service.round_trips == 1
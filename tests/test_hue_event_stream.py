@@ -0,0 +1,111 @@
+import asyncio
+import copy
+
+from fakes.hue_bridge import FakeHueBridge, make_resources
+from plugins.phillips_hue_lights_plugin import LightsPlugin
+
+
+async def wait_until(predicate, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+async def start_plugin(bridge: FakeHueBridge) -> LightsPlugin:
+    plugin = LightsPlugin(bridge_url=bridge.url, subscribe_events=True)
+    plugin.event_stream.retry_seconds = 0.05
+    await plugin.start()
+    await asyncio.wait_for(plugin.event_stream.connected.wait(), 2)
+    return plugin
+
+
+def test_updates_from_elsewhere_are_applied_to_the_registry():
+    async def run():
+        async with FakeHueBridge(make_resources({"Kitchen": 2})) as bridge:
+            plugin = await start_plugin(bridge)
+            try:
+                light = plugin.registry.get_light("kitchen-light-1")
+                assert light.is_on
+
+                # A wall switch turns the light off
+                bridge.set_state(light.id, {"on": {"on": False}, "dimming": {"brightness": 40.0}})
+                await wait_until(lambda: not light.is_on)
+                assert light.brightness == 40.0
+                # Answered from memory, without asking the bridge
+                requests = len(bridge.requests)
+                assert (await plugin.get_light_state("kitchen-light-1"))["is_on"] is False
+                assert len(bridge.requests) == requests
+            finally:
+                await plugin.close()
+
+    asyncio.run(run())
+
+
+def test_added_lights_trigger_a_resync():
+    async def run():
+        async with FakeHueBridge(make_resources({"Kitchen": 1})) as bridge:
+            plugin = await start_plugin(bridge)
+            try:
+                for resource in make_resources({"Garage": 1}):
+                    bridge.resources[resource["id"]] = copy.deepcopy(resource)
+                bridge.push_event("add", [{"id": "new", "type": "light"}])
+
+                await wait_until(lambda: plugin.registry.get_group("Garage") is not None)
+                assert [light.name for light in plugin.registry.lights_in_group("Garage")] == ["garage-light-1"]
+            finally:
+                await plugin.close()
+
+    asyncio.run(run())
+
+
+def test_reconnecting_resyncs_missed_changes():
+    async def run():
+        async with FakeHueBridge(make_resources({"Kitchen": 1})) as bridge:
+            plugin = await start_plugin(bridge)
+            try:
+                light = plugin.registry.get_light("kitchen-light-1")
+                # The stream drops and a change happens while nobody is subscribed
+                for queue in list(bridge.subscribers):
+                    queue.put_nowait(None)
+                await wait_until(lambda: not plugin.event_stream.connected.is_set())
+                bridge.resources[light.id]["on"] = {"on": False}
+
+                await wait_until(lambda: plugin.registry.get_light("kitchen-light-1").is_on is False)
+            finally:
+                await plugin.close()
+
+    asyncio.run(run())
+
+
+def test_malformed_events_and_failed_resyncs_dont_stop_the_stream():
+    async def run():
+        async with FakeHueBridge(make_resources({"Kitchen": 1})) as bridge:
+            plugin = await start_plugin(bridge)
+            try:
+                light = plugin.registry.get_light("kitchen-light-1")
+                bridge.push_event("update", [{"type": "light"}])
+                bridge.set_state(light.id, {"on": {"on": False}})
+                await wait_until(lambda: not light.is_on)
+
+                # The first resync after reconnecting gets a bad response, so the stream reconnects again
+                failures = []
+
+                async def flaky_resync():
+                    if not failures:
+                        failures.append(True)
+                        raise KeyError("data")
+                    await plugin.sync()
+
+                plugin.event_stream.resync = flaky_resync
+                for queue in list(bridge.subscribers):
+                    queue.put_nowait(None)
+                await wait_until(lambda: not plugin.event_stream.connected.is_set())
+                bridge.resources[light.id]["on"] = {"on": True}
+
+                await wait_until(lambda: plugin.registry.get_light("kitchen-light-1").is_on is True)
+                assert failures
+            finally:
+                await plugin.close()
+
+    asyncio.run(run())
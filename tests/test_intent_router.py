@@ -0,0 +1,55 @@
+import asyncio
+
+from fakes.chat_service import ScriptedChatCompletion
+from fakes.hue_bridge import FakeHueBridge, make_resources
+from managers.sk_manager import SKManager
+from plugins.phillips_hue_lights_plugin import LightsPlugin
+
+ROOMS = {"Sam's Bedroom": 2, "Guest Bedroom": 1, "Kitchen": 2}
+SCRIPT = [{"match": "turn off the bedroom lights", "reply": "Which bedroom?"}]
+
+
+def run_with_manager(test) -> None:
+    async def run():
+        async with FakeHueBridge(make_resources(ROOMS)) as bridge:
+            plugins = [{"plugin": LightsPlugin(bridge_url=bridge.url), "plugin_name": "Lights"}]
+            chat_completion = ScriptedChatCompletion(SCRIPT)
+            sk_manager = SKManager(plugins, cache_plans=False, chat_completion=chat_completion)
+            await sk_manager.start()
+            try:
+                await test(sk_manager, chat_completion, bridge)
+            finally:
+                await sk_manager.close()
+
+    asyncio.run(run())
+
+
+def test_unambiguous_target_is_handled_locally():
+    async def test(sk_manager, chat_completion, bridge):
+        reply = await sk_manager.make_user_request("Hey Jarvis, turn off Sam's bedroom lights please.")
+        assert sk_manager.last_request_path == "fast"
+        assert "Sam's Bedroom" in str(reply)
+        assert chat_completion.round_trips == 0
+        group = sk_manager.router.lights_registry.get_group("Sam's Bedroom")
+        assert bridge.resources[group.id]["on"] == {"on": False}
+
+    run_with_manager(test)
+
+
+def test_ambiguous_target_falls_back_to_the_llm_without_touching_the_lights():
+    async def test(sk_manager, chat_completion, bridge):
+        assert await sk_manager.router.route("turn off the bedroom lights") is None
+
+        reply = await sk_manager.make_user_request("Turn off the bedroom lights.")
+        assert str(reply) == "Which bedroom?"
+        assert sk_manager.last_request_path == "llm"
+        assert not any(method == "PUT" for method, _ in bridge.requests)
+
+    run_with_manager(test)
+
+
+def test_unknown_target_falls_back_to_the_llm():
+    async def test(sk_manager, chat_completion, bridge):
+        assert await sk_manager.router.route("turn on the garage lights") is None
+
+    run_with_manager(test)
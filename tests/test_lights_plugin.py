@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import semantic_kernel as sk
+from semantic_kernel.functions import KernelArguments
+
+from fakes.hue_bridge import FakeHueBridge, make_resources
+from plugins.phillips_hue_lights_plugin import LightsPlugin
+
+
+def run_with_plugin(test, rooms: dict[str, int], **options) -> None:
+    async def run():
+        async with FakeHueBridge(make_resources(rooms)) as bridge:
+            plugin = LightsPlugin(bridge_url=bridge.url, **options)
+            await plugin.start()
+            kernel = sk.Kernel()
+            kernel.add_plugin(plugin, plugin_name="Lights")
+            try:
+                await test(kernel, plugin, bridge)
+            finally:
+                await plugin.close()
+
+    asyncio.run(run())
+
+
+def test_change_lights_state_can_be_invoked_through_the_kernel_with_optional_selectors():
+    async def test(kernel, plugin, bridge):
+        # Either selector may be left out, as the LLM does
+        result = await kernel.invoke(
+            plugin_name="Lights", function_name="change_lights_state",
+            arguments=KernelArguments(new_light_state={"is_on": False}, name_pattern="bedroom-light-*"),
+        )
+        assert sorted(change["name"] for change in result.value) == ["bedroom-light-1", "bedroom-light-2", "bedroom-light-3"]
+        assert all(change["ok"] for change in result.value)
+
+        light_id = plugin.registry.get_light("bedroom-light-1").id
+        result = await kernel.invoke(
+            plugin_name="Lights", function_name="change_lights_state",
+            arguments=KernelArguments(new_light_state={"is_on": True}, ids=[light_id]),
+        )
+        assert [change["id"] for change in result.value] == [light_id]
+        assert bridge.resources[light_id]["on"] == {"on": True}
+
+    run_with_plugin(test, {"Bedroom": 3})
+
+
+def test_commands_are_paced_to_the_configured_rate():
+    async def test(kernel, plugin, bridge):
+        started = time.perf_counter()
+        await plugin.change_lights_state({"is_on": False}, name_pattern="*")
+        # Six commands at 20 per second: at least five intervals between the first and the last
+        assert time.perf_counter() - started >= 5 / 20
+        assert sum(method == "PUT" for method, _ in bridge.requests) == 6
+
+    run_with_plugin(test, {"Hall": 6}, max_commands_per_second=20.0)
+
+
+def test_lights_removed_before_their_command_are_reported_as_failed():
+    async def test(kernel, plugin, bridge):
+        change_light_state = plugin.change_light_state
+        removed = plugin.registry.get_light("bedroom-light-2")
+
+        async def remove_then_change(light_id, new_light_state):
+            # The light is deleted from the bridge after change_lights_state selected it
+            plugin.registry.lights.pop(removed.id, None)
+            return await change_light_state(light_id, new_light_state)
+
+        plugin.change_light_state = remove_then_change
+        results = {change["name"]: change for change in await plugin.change_lights_state({"is_on": False}, name_pattern="*")}
+        assert results["bedroom-light-2"]["ok"] is False
+        assert results["bedroom-light-2"]["error"] == "light not found"
+        assert results["bedroom-light-1"]["ok"] and results["bedroom-light-1"]["error"] is None
+
+    run_with_plugin(test, {"Bedroom": 2})
@@ -0,0 +1,135 @@
+import asyncio
+
+from fakes.chat_service import ScriptedChatCompletion
+from fakes.hue_bridge import FakeHueBridge, make_resources
+from fakes.weather_api import FakeWeatherAPI
+from managers.sk_manager import SKManager
+from plugins.phillips_hue_lights_plugin import LightsPlugin
+from plugins.weather_plugin import WeatherPlugin
+
+SCRIPT = [
+    {
+        "match": "turn off the kitchen lights",
+        "calls": [{"function": "Lights-change_group_state", "arguments": {"id": "Kitchen", "new_group_state": {"is_on": False}}}],
+        "reply": "The kitchen lights are off.",
+    },
+    {
+        "match": "how warm is it in chicago",
+        "calls": [{"function": "Weather-get_weather_info", "arguments": {"city": "Chicago"}}],
+        "reply": "It's mild in Chicago.",
+    },
+    {
+        # "it" and "the lights" only mean the kitchen because of an earlier turn
+        "match": "turn (it|the lights) off",
+        "calls": [{"function": "Lights-change_group_state", "arguments": {"id": "Kitchen", "new_group_state": {"is_on": False}}}],
+        "reply": "The kitchen lights are off.",
+    },
+    {
+        "match": "turn off the kitchen if chicago is warm",
+        "calls": [
+            {"function": "Lights-change_group_state", "arguments": {"id": "Kitchen", "new_group_state": {"is_on": False}}},
+            {"function": "Weather-get_weather_info", "arguments": {"city": "Chicago"}},
+        ],
+        "reply": "It's warm in Chicago, so the kitchen lights are off.",
+    },
+    {"match": "hello", "reply": "Hi!"},
+]
+
+
+async def ask(sk_manager: SKManager, message: str) -> tuple[str, str]:
+    reply = str(await sk_manager.make_user_request(message))
+    return reply, sk_manager.last_request_path
+
+
+def run_with_manager(test) -> None:
+    async def run():
+        async with FakeHueBridge(make_resources({"Kitchen": 2})) as bridge, FakeWeatherAPI() as weather_api:
+            plugins = [
+                {"plugin": LightsPlugin(bridge_url=bridge.url), "plugin_name": "Lights"},
+                # No weather caching, so every replay sees the current API response
+                {"plugin": WeatherPlugin(ttl_seconds=0, base_url=weather_api.base_url), "plugin_name": "Weather"},
+            ]
+            chat_completion = ScriptedChatCompletion(SCRIPT)
+            sk_manager = SKManager(plugins, fast_path=False, chat_completion=chat_completion)
+            await sk_manager.start()
+            try:
+                await test(sk_manager, chat_completion, bridge, weather_api)
+            finally:
+                await sk_manager.close()
+
+    asyncio.run(run())
+
+
+def test_repeated_request_replays_the_plan_without_the_llm():
+    async def test(sk_manager, chat_completion, bridge, weather_api):
+        assert await ask(sk_manager, "Turn off the kitchen lights.") == ("The kitchen lights are off.", "llm")
+        round_trips = chat_completion.round_trips
+        puts = sum(method == "PUT" for method, _ in bridge.requests)
+
+        # Matched on the normalized transcript, and the calls are still made against the bridge
+        assert await ask(sk_manager, "turn off the Kitchen lights") == ("The kitchen lights are off.", "cache")
+        assert chat_completion.round_trips == round_trips
+        assert sum(method == "PUT" for method, _ in bridge.requests) == puts + 1
+
+    run_with_manager(test)
+
+
+def test_requests_without_function_calls_are_not_cached():
+    async def test(sk_manager, chat_completion, bridge, weather_api):
+        assert await ask(sk_manager, "hello") == ("Hi!", "llm")
+        assert await ask(sk_manager, "hello") == ("Hi!", "llm")
+        assert not sk_manager.plan_cache.entries
+
+    run_with_manager(test)
+
+
+def test_changed_function_result_invalidates_the_plan():
+    async def test(sk_manager, chat_completion, bridge, weather_api):
+        assert (await ask(sk_manager, "How warm is it in Chicago?"))[1] == "llm"
+        assert (await ask(sk_manager, "How warm is it in Chicago?"))[1] == "cache"
+
+        # The weather moved on, so the recorded reply may be wrong
+        weather_api.cities["chicago"]["temp"] += 10
+        assert (await ask(sk_manager, "How warm is it in Chicago?"))[1] == "llm"
+
+    run_with_manager(test)
+
+
+def test_changing_the_plugins_clears_the_cache():
+    async def test(sk_manager, chat_completion, bridge, weather_api):
+        await ask(sk_manager, "Turn off the kitchen lights.")
+        assert sk_manager.plan_cache.entries
+
+        sk_manager.kernel.add_plugin(WeatherPlugin(base_url=weather_api.base_url), plugin_name="MoreWeather")
+        assert await ask(sk_manager, "Turn off the kitchen lights.") == ("The kitchen lights are off.", "llm")
+
+    run_with_manager(test)
+
+
+def test_requests_that_depend_on_earlier_turns_are_not_cached():
+    async def test(sk_manager, chat_completion, bridge, weather_api):
+        assert (await ask(sk_manager, "Turn it off."))[1] == "llm"
+        assert (await ask(sk_manager, "Turn it off."))[1] == "llm"
+        # The target isn't in the request, so the model took it from the earlier turns
+        assert (await ask(sk_manager, "Turn the lights off."))[1] == "llm"
+        assert not sk_manager.plan_cache.entries
+
+        # Everything this plan needs is in the request itself
+        assert (await ask(sk_manager, "Turn off the kitchen lights."))[1] == "llm"
+        assert (await ask(sk_manager, "Turn off the kitchen lights."))[1] == "cache"
+
+    run_with_manager(test)
+
+
+def test_reads_are_checked_before_anything_is_changed():
+    async def test(sk_manager, chat_completion, bridge, weather_api):
+        message = "Turn off the kitchen if Chicago is warm."
+        assert (await ask(sk_manager, message))[1] == "llm"
+        puts = sum(method == "PUT" for method, _ in bridge.requests)
+
+        weather_api.cities["chicago"]["temp"] += 10
+        assert (await ask(sk_manager, message))[1] == "llm"
+        # Only the LLM's own command reached the bridge, not one from the discarded replay
+        assert sum(method == "PUT" for method, _ in bridge.requests) == puts + 1
+
+    run_with_manager(test)
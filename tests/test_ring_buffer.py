@@ -0,0 +1,50 @@
+import threading
+import numpy as np
+
+from managers.ring_buffer import AudioRingBuffer
+
+
+def test_reads_samples_in_order():
+    ring = AudioRingBuffer(1000)
+    reader = ring.reader()
+    ring.write(np.arange(300, dtype=np.int16))
+
+    assert list(reader.read(100)) == list(range(100))
+    assert list(reader.read(200)) == list(range(100, 300))
+    assert reader.dropped == 0
+
+
+def test_lapped_reader_skips_to_oldest_safe_audio_and_counts_dropped_samples():
+    ring = AudioRingBuffer(1000)
+    reader = ring.reader()
+    for start in range(0, 2000, 500):
+        ring.write(np.arange(start, start + 500, dtype=np.int16))
+
+    # The last 500 samples the writer may be overwriting next are never handed out, so 1500 is the oldest safe
+    samples = reader.read(100)
+    assert reader.dropped == 1500
+    assert list(samples) == list(range(1500, 1600))
+    assert list(reader.read(400)) == list(range(1600, 2000))
+
+
+def test_each_reader_keeps_its_own_position():
+    ring = AudioRingBuffer(1000)
+    first, second = ring.reader(), ring.reader()
+    ring.write(np.arange(200, dtype=np.int16))
+
+    first.read(150)
+    assert first.available() == 50
+    assert second.available() == 200
+
+
+def test_read_times_out_and_close_wakes_blocked_readers():
+    ring = AudioRingBuffer(1000)
+    reader = ring.reader()
+    assert reader.read(10, timeout=0.01) is None
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(reader.read(10)))
+    thread.start()
+    ring.close()
+    thread.join(timeout=1)
+    assert results == [None]
@@ -0,0 +1,41 @@
+import asyncio
+
+from fakes.weather_api import FakeWeatherAPI
+from plugins.weather_plugin import WeatherPlugin
+
+
+def run_with_plugin(test, latency: float = 0.0, **options) -> None:
+    async def run():
+        async with FakeWeatherAPI(latency=latency) as weather_api:
+            plugin = WeatherPlugin(base_url=weather_api.base_url, **options)
+            try:
+                await test(plugin, weather_api)
+            finally:
+                await plugin.close()
+
+    asyncio.run(run())
+
+
+def test_concurrent_requests_for_a_city_share_one_fetch():
+    async def test(plugin, weather_api):
+        results = await asyncio.gather(*(plugin.get_weather_info(city) for city in ["Chicago", "chicago", " CHICAGO "] * 3))
+        assert all(result == results[0] for result in results)
+        # One current weather and one forecast request
+        assert len(weather_api.requests) == 2
+        assert list(plugin.cache) == ["chicago"] and not plugin.in_flight
+
+    run_with_plugin(test, latency=0.1)
+
+
+def test_cached_answers_expire_after_the_ttl():
+    async def test(plugin, weather_api):
+        first = await plugin.get_weather_info("Seattle")
+        weather_api.cities["seattle"]["temp"] += 10
+        assert await plugin.get_weather_info("Seattle") == first
+        assert len(weather_api.requests) == 2
+
+        await asyncio.sleep(0.25)
+        assert (await plugin.get_weather_info("Seattle"))["current_temp"] == first["current_temp"] + 10
+        assert len(weather_api.requests) == 4
+
+    run_with_plugin(test, ttl_seconds=0.2)